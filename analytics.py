@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# 收支分析引擎：一次整理帳本，產生日 / 月序列與各種樞紐表
+# ==========================================
+INCOME_TYPE = "收入"
+
+def _col(df, name):
+    return df[name] if name in df.columns else pd.Series("", index=df.index)
+
+def prepare_ledger(df):
+    cols = ["Date", "Month", "Main_Category", "Payment_Method", "Amount", "Is_Income"]
+    if df.empty or "Date" not in df.columns:
+        return pd.DataFrame(columns=cols)
+
+    dates = pd.to_datetime(df["Date"], errors='coerce').dt.normalize()
+    ledger = pd.DataFrame({
+        "Date": dates,
+        "Main_Category": _col(df, "Main_Category").astype(str),
+        "Payment_Method": _col(df, "Payment_Method").astype(str),
+        "Amount": pd.to_numeric(_col(df, "Amount_Def"), errors='coerce'),
+        "Is_Income": (_col(df, "Type") == INCOME_TYPE).to_numpy(),
+    }, index=df.index)
+    ledger["Amount"] = ledger["Amount"].fillna(0.0)
+    ledger = ledger[ledger["Date"].notna()]
+    # datetime64[M] 直接轉 "YYYY-MM"，比逐筆 strftime 快很多
+    ledger["Month"] = ledger["Date"].to_numpy().astype("datetime64[M]").astype(str)
+    return ledger[cols]
+
+def build_series(ledger):
+    if ledger.empty:
+        empty_daily = pd.DataFrame(columns=["Income", "Expense", "Net", "Expense_7D", "Expense_30D"], dtype=float)
+        empty_monthly = pd.DataFrame(columns=["Income", "Expense", "Net", "Expense_3M", "Expense_LY", "Expense_YoY"], dtype=float)
+        return {"daily": empty_daily, "monthly": empty_monthly, "by_category": pd.DataFrame(), "by_payment": pd.DataFrame(), "month_rows": {}}
+
+    is_income = ledger["Is_Income"].to_numpy(dtype=bool)
+    amount = ledger["Amount"].to_numpy(dtype=float)
+    flows = pd.DataFrame({
+        "Income": np.where(is_income, amount, 0.0),
+        "Expense": np.where(is_income, 0.0, amount),
+    }, index=ledger["Date"].to_numpy())
+
+    # 日序列：補齊沒有交易的日子，再算移動平均
+    daily = flows.groupby(level=0).sum().resample("D").sum()
+    daily["Net"] = daily["Income"] - daily["Expense"]
+    daily["Expense_7D"] = daily["Expense"].rolling(7, min_periods=1).mean()
+    daily["Expense_30D"] = daily["Expense"].rolling(30, min_periods=1).mean()
+
+    # 月序列由日序列彙總，月份連續所以 shift(12) 就是去年同月
+    monthly = daily[["Income", "Expense", "Net"]].resample("MS").sum()
+    monthly["Expense_3M"] = monthly["Expense"].rolling(3, min_periods=1).mean()
+    monthly["Expense_LY"] = monthly["Expense"].shift(12)
+    monthly["Expense_YoY"] = (monthly["Expense"] - monthly["Expense_LY"]) / monthly["Expense_LY"].where(monthly["Expense_LY"] != 0)
+    monthly.index = monthly.index.strftime("%Y-%m")
+
+    expenses = ledger[~is_income]
+    by_category = expenses.pivot_table(index="Month", columns="Main_Category", values="Amount", aggfunc="sum", fill_value=0.0)
+    by_payment = expenses.pivot_table(index="Month", columns="Payment_Method", values="Amount", aggfunc="sum", fill_value=0.0)
+
+    # 每月對應到原始帳本的列標籤，明細表不必再掃整本帳
+    month_rows = {m: ledger.index[pos].to_numpy() for m, pos in ledger.groupby("Month").indices.items()}
+    return {"daily": daily, "monthly": monthly, "by_category": by_category, "by_payment": by_payment, "month_rows": month_rows}
+
+def range_report(series, start_month, end_month):
+    monthly = series["monthly"].loc[start_month:end_month]
+    end_day = pd.Period(end_month, freq="M").end_time.normalize()
+    daily = series["daily"].loc[pd.Timestamp(start_month + "-01"):end_day]
+
+    by_category = series["by_category"].loc[start_month:end_month]
+    totals = by_category.sum(axis=1)
+    share = by_category.div(totals.where(totals != 0), axis=0).fillna(0.0)
+
+    payment = series["by_payment"].loc[start_month:end_month].sum()
+    payment = payment[payment > 0].sort_values(ascending=False)
+    return {"monthly": monthly, "daily": daily, "category_share": share, "payment": payment}
+
+def month_summary(series, month):
+    monthly = series["monthly"]
+    income = float(monthly.at[month, "Income"]) if month in monthly.index else 0.0
+    expense = float(monthly.at[month, "Expense"]) if month in monthly.index else 0.0
+    by_category = series["by_category"]
+    categories = by_category.loc[month] if month in by_category.index else pd.Series(dtype=float)
+    categories = categories[categories > 0].sort_values(ascending=False)
+    return {"income": income, "expense": expense, "categories": categories}
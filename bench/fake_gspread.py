@@ -0,0 +1,282 @@
+import json
+import random
+import threading
+import time
+from collections import deque
+from datetime import date, timedelta
+
+from gspread.exceptions import APIError, SpreadsheetNotFound, WorksheetNotFound
+from gspread.utils import a1_to_rowcol, numericise_all
+
+# ==========================================
+# 離線用的假 Google Sheets：只實作 app 用到的 Spreadsheet / Worksheet 介面
+# ==========================================
+_real_sleep = time.sleep
+
+TX_HEADER = ["Date", "Type", "Main_Category", "Sub_Category", "Payment_Method", "Currency", "Amount_Original", "Amount_Def", "Note", "Timestamp", "ID", "Version"]
+REC_HEADER = ["Day", "Type", "Main_Category", "Sub_Category", "Payment_Method", "Currency", "Amount_Original", "Note", "Last_Run_Month", "Status", "ID", "Version"]
+SETTINGS_HEADER = ["Main_Category", "Sub_Category", "Payment_Method", "Currency", "Default_Currency", "Budget_Category", "Budget_Amount"]
+
+class _QuotaResponse:
+    status_code = 429
+    text = "Quota exceeded"
+
+    def json(self):
+        return {"error": {"code": 429, "message": "Quota exceeded for quota metric 'Read requests'", "status": "RESOURCE_EXHAUSTED"}}
+
+class FakeBackend:
+    # latency: 每次呼叫的固定延遲 (秒)；latency_per_1k_cells: 讀寫資料量的延遲
+    # quota_per_minute: 每分鐘可用的呼叫數，超過就丟 429 APIError
+    def __init__(self, latency=0.0, latency_per_1k_cells=0.0, quota_per_minute=None, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.latency_per_1k_cells = latency_per_1k_cells
+        self.quota_per_minute = quota_per_minute
+        self.error_rate = error_rate
+        self.calls = []
+        self.spreadsheets = {}
+        self._window = deque()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def add_spreadsheet(self, title, sheets, url=None):
+        ss = FakeSpreadsheet(self, title, sheets)
+        self.spreadsheets[title] = ss
+        if url:
+            self.spreadsheets[url] = ss
+        return ss
+
+    def call(self, scope, method, cells=0):
+        with self._lock:
+            now = time.monotonic()
+            if self.quota_per_minute is not None:
+                while self._window and now - self._window[0] > 60:
+                    self._window.popleft()
+                if len(self._window) >= self.quota_per_minute:
+                    raise APIError(_QuotaResponse())
+                self._window.append(now)
+            if self.error_rate and self._random.random() < self.error_rate:
+                raise APIError(_QuotaResponse())
+            self.calls.append((scope, method))
+        delay = self.latency + self.latency_per_1k_cells * cells / 1000
+        if delay:
+            _real_sleep(delay)
+
+    def reset_calls(self):
+        with self._lock:
+            self.calls.clear()
+
+def _split_range(rng):
+    rng = rng.split("!")[-1]
+    start, _, end = rng.partition(":")
+    return a1_to_rowcol(start), a1_to_rowcol(end or start)
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet, sheet_id, title, rows):
+        self.spreadsheet = spreadsheet
+        self.id = sheet_id
+        self.title = title
+        self.rows = [list(r) for r in rows]
+        self.col_count = max([26] + [len(r) for r in self.rows])
+
+    @property
+    def _backend(self):
+        return self.spreadsheet.backend
+
+    def _cells(self, rows):
+        return sum(len(r) for r in rows)
+
+    def _set(self, r, c, value):
+        while len(self.rows) < r:
+            self.rows.append([])
+        row = self.rows[r - 1]
+        while len(row) < c:
+            row.append("")
+        row[c - 1] = value
+
+    def _write(self, rng, values):
+        (r0, c0), _ = _split_range(rng)
+        for i, vals in enumerate(values):
+            for j, v in enumerate(vals):
+                self._set(r0 + i, c0 + j, v)
+
+    def _read(self, rng):
+        (r0, c0), (r1, c1) = _split_range(rng)
+        out = []
+        for r in range(r0, r1 + 1):
+            row = self.rows[r - 1] if r <= len(self.rows) else []
+            out.append([str(row[c - 1]) if c <= len(row) else "" for c in range(c0, c1 + 1)])
+        return out
+
+    def get_all_records(self, numericise_ignore=()):
+        self._backend.call(self.title, "get_all_records", self._cells(self.rows))
+        if not self.rows:
+            return []
+        width = max(len(r) for r in self.rows)
+        header = [str(h) for h in self.rows[0]] + [""] * (width - len(self.rows[0]))
+        dupes = {h for h in header if header.count(h) > 1}
+        if dupes:
+            raise Exception(f"the header row in the worksheet contains duplicates: {sorted(dupes)}")
+        records = []
+        for row in self.rows[1:]:
+            values = [str(v) for v in row] + [""] * (width - len(row))
+            if "all" not in numericise_ignore:
+                values = numericise_all(values, False, "", ignore=list(numericise_ignore))
+            records.append(dict(zip(header, values)))
+        return records
+
+    def get_all_values(self):
+        self._backend.call(self.title, "get_all_values", self._cells(self.rows))
+        return [[str(v) for v in r] for r in self.rows]
+
+    def row_values(self, row):
+        self._backend.call(self.title, "row_values")
+        return [str(v) for v in self.rows[row - 1]] if row <= len(self.rows) else []
+
+    def col_values(self, col):
+        self._backend.call(self.title, "col_values", len(self.rows))
+        values = [str(r[col - 1]) if col <= len(r) else "" for r in self.rows]
+        while values and values[-1] == "":
+            values.pop()
+        return values
+
+    def batch_get(self, ranges):
+        self._backend.call(self.title, "batch_get", len(ranges))
+        return [self._read(rng) for rng in ranges]
+
+    def update(self, values=None, range_name=None):
+        self._backend.call(self.title, "update", self._cells(values))
+        self._write(range_name or "A1", values)
+
+    def batch_update(self, data):
+        self._backend.call(self.title, "batch_update", sum(self._cells(d["values"]) for d in data))
+        for d in data:
+            self._write(d["range"], d["values"])
+
+    def update_cell(self, row, col, value):
+        self._backend.call(self.title, "update_cell", 1)
+        self._set(row, col, value)
+
+    def append_row(self, values, **kwargs):
+        self._backend.call(self.title, "append_row", len(values))
+        # 跟 Sheets API 一樣，附加在最後一列有資料的下方
+        while self.rows and not any(str(v) for v in self.rows[-1]):
+            self.rows.pop()
+        self.rows.append(list(values))
+        n = len(self.rows)
+        return {"updates": {"updatedRange": f"{self.title}!A{n}:{n}", "updatedRows": 1}}
+
+    def add_cols(self, cols):
+        self._backend.call(self.title, "add_cols")
+        self.col_count += cols
+
+    def delete_rows(self, start_index, end_index=None):
+        self._backend.call(self.title, "delete_rows")
+        del self.rows[start_index - 1:(end_index or start_index)]
+
+    def clear(self):
+        self._backend.call(self.title, "clear")
+        self.rows = []
+
+class FakeSpreadsheet:
+    def __init__(self, backend, title, sheets):
+        self.backend = backend
+        self.title = title
+        self._worksheets = {}
+        for i, (name, rows) in enumerate(sheets.items()):
+            self._worksheets[name] = FakeWorksheet(self, i + 1, name, rows)
+
+    def worksheet(self, title):
+        self.backend.call("(spreadsheet)", "worksheet")
+        if title not in self._worksheets:
+            raise WorksheetNotFound(title)
+        return self._worksheets[title]
+
+    def worksheets(self):
+        self.backend.call("(spreadsheet)", "worksheets")
+        return list(self._worksheets.values())
+
+    def batch_update(self, body):
+        self.backend.call("(spreadsheet)", "batch_update", len(json.dumps(body)) // 10)
+        by_id = {ws.id: ws for ws in self._worksheets.values()}
+        for request in body.get("requests", []):
+            rng = request["deleteDimension"]["range"]
+            ws = by_id[rng["sheetId"]]
+            del ws.rows[rng["startIndex"]:rng["endIndex"]]
+        return {"replies": [{} for _ in body.get("requests", [])]}
+
+class FakeClient:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def _get(self, key):
+        self.backend.call("(spreadsheet)", "open")
+        if key not in self.backend.spreadsheets:
+            raise SpreadsheetNotFound(key)
+        return self.backend.spreadsheets[key]
+
+    def open(self, title):
+        return self._get(title)
+
+    def open_by_url(self, url):
+        return self._get(url)
+
+# ==========================================
+# 合成帳本
+# ==========================================
+# 跟 sheets.new_row_id() 一樣是 12 位十六進位；前幾筆刻意用看起來像數字的 ID
+NUMERIC_LOOKING_IDS = ["012345678901", "292571311e40", "123456789012"]
+
+def _hex_id(rng):
+    return f"{rng.getrandbits(48):012x}"
+
+CATEGORIES = {"食": ["早餐", "午餐", "晚餐"], "行": ["捷運", "加油"], "衣": ["衣服"], "樂": ["電影", "旅遊"], "收入": ["薪資", "獎金"]}
+PAYMENTS = ["現金", "信用卡", "悠遊卡"]
+
+def make_ledger(n_rows, end=None, seed=0):
+    rng = random.Random(seed)
+    end = end or date.today()
+    span = max(365 * 3, n_rows // 50)
+    rows = [TX_HEADER]
+    expense_cats = [c for c in CATEGORIES if c != "收入"]
+    for i in range(n_rows):
+        d = end - timedelta(days=rng.randrange(span))
+        if rng.random() < 0.05:
+            main, amount = "收入", rng.randrange(20000, 80000)
+        else:
+            main, amount = rng.choice(expense_cats), rng.randrange(30, 3000)
+        sub = rng.choice(CATEGORIES[main])
+        tx_type = "收入" if main == "收入" else "支出"
+        row_id = NUMERIC_LOOKING_IDS[i] if i < len(NUMERIC_LOOKING_IDS) else _hex_id(rng)
+        rows.append([str(d), tx_type, main, sub, rng.choice(PAYMENTS), "TWD", amount, amount, f"note {i}", f"{d} 12:00:00", row_id, 1])
+    return rows
+
+def make_settings():
+    rows = [SETTINGS_HEADER]
+    pairs = [(m, s) for m, subs in CATEGORIES.items() for s in subs]
+    extras = [(p, c) for p, c in zip(PAYMENTS, ["TWD", "USD", "JPY"])]
+    budgets = [("食", 12000), ("行", 3000), ("樂", 5000)]
+    for i, (main, sub) in enumerate(pairs):
+        pay, curr = extras[i] if i < len(extras) else ("", "")
+        budget = budgets[i] if i < len(budgets) else ("", "")
+        rows.append([main, sub, pay, curr, "TWD" if i == 0 else "", budget[0], budget[1]])
+    return rows
+
+def make_recurring(n_pending=0, today=None, seed=0):
+    rng = random.Random(seed)
+    today = today or date.today()
+    last_month = (today.replace(day=1) - timedelta(days=1)).strftime("%Y-%m")
+    rows = [REC_HEADER]
+    for i in range(n_pending):
+        row_id = NUMERIC_LOOKING_IDS[-1 - i] if i < len(NUMERIC_LOOKING_IDS) else _hex_id(rng)
+        rows.append([1, "支出", "行", "捷運", "信用卡", "TWD", 1200, f"rule {i}", last_month, "Active", row_id, 1])
+    rows.append([28, "支出", "樂", "電影", "信用卡", "TWD", 390, "串流訂閱", last_month, "Active", _hex_id(rng), 1])
+    return rows
+
+def make_backend(n_rows, pending_rules=0, title="Benchmark Ledger", seed=0, **backend_kwargs):
+    backend = FakeBackend(seed=seed, **backend_kwargs)
+    backend.add_spreadsheet(title, {
+        "Transactions": make_ledger(n_rows, seed=seed),
+        "Recurring": make_recurring(pending_rules, seed=seed),
+        "Settings": make_settings(),
+    })
+    return backend
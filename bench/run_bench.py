@@ -0,0 +1,296 @@
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+# ==========================================
+# 離線效能測試：假 Google Sheets + 固定匯率表，用 Streamlit AppTest 跑整個 app
+#   python bench/run_bench.py                       # 1k / 10k / 100k 筆
+#   python bench/run_bench.py --sizes 1000 --repeat 5 --latency 0.15
+# 結果會附加到 bench/results/history.jsonl，並與上一次相同條件的結果比較
+# ==========================================
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+APP_PATH = os.path.join(ROOT, "app.py")
+RATES_FIXTURE = os.path.join(BENCH_DIR, "fixtures", "bot_rates.html")
+DEFAULT_HISTORY = os.path.join(BENCH_DIR, "results", "history.jsonl")
+SHEET_TITLE = "Benchmark Ledger"
+SCENARIOS = ["login", "cold_load", "warm_rerun", "submit", "recurring_run", "settings_save"]
+FRESH_SCENARIOS = ["fresh_login", "fresh_cold_load"]
+
+os.environ.setdefault("TRACE_LOG_LEVEL", "WARNING")
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, ROOT)
+# fake_gspread / pandas / gspread 都在用到時才 import，fresh_login 才量得到 app 自己的載入時間
+
+_real_sleep = time.sleep
+
+def _skip_ui_pauses(seconds):
+    # app 在 toast 後會 sleep(1)；量測時略過，AppTest 自己的短暫輪詢照常
+    if seconds < 0.5:
+        _real_sleep(seconds)
+
+@contextmanager
+def offline(backend):
+    import fake_gspread
+    import gspread
+    import pandas as pd
+    from oauth2client.service_account import ServiceAccountCredentials
+
+    real_read_html = pd.read_html
+    with open(RATES_FIXTURE, encoding="utf-8") as f:
+        rates_html = f.read()
+
+    with mock.patch.object(ServiceAccountCredentials, "from_json_keyfile_dict", return_value=object()), \
+            mock.patch.object(ServiceAccountCredentials, "from_json_keyfile_name", return_value=object()), \
+            mock.patch.object(gspread, "authorize", return_value=fake_gspread.FakeClient(backend)), \
+            mock.patch.object(pd, "read_html", side_effect=lambda *a, **k: real_read_html(io.StringIO(rates_html))), \
+            mock.patch("time.sleep", _skip_ui_pauses):
+        yield
+
+def clear_caches():
+    import streamlit as st
+    st.cache_data.clear()
+    st.cache_resource.clear()
+
+def new_session(sheet=SHEET_TITLE):
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(APP_PATH, default_timeout=900)
+    at.secrets["gcp_service_account"] = {"client_email": "bench@example.iam.gserviceaccount.com"}
+    if sheet:
+        at.query_params["sheet"] = sheet
+    return at
+
+def _check(at):
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    return at
+
+def _stage_totals():
+    import tracing
+    with tracing._registry_lock:
+        return {name: seconds for name, (seconds, _) in tracing._registry["stages"].items()}
+
+def measure(backend, action):
+    backend.reset_calls()
+    before = _stage_totals()
+    t0 = time.perf_counter()
+    action()
+    seconds = time.perf_counter() - t0
+    after = _stage_totals()
+    stages = {k: v - before.get(k, 0.0) for k, v in after.items() if v - before.get(k, 0.0) > 0}
+    return {"seconds": seconds, "api_calls": len(backend.calls), "stages": stages}
+
+# ==========================================
+# 情境
+# ==========================================
+def run_login(backend, repeat):
+    return [measure(backend, lambda: _check(new_session(sheet=None).run())) for _ in range(repeat)]
+
+def run_cold_load(backend, repeat):
+    samples = []
+    for _ in range(repeat):
+        clear_caches()
+        samples.append(measure(backend, lambda: _check(new_session().run())))
+    return samples
+
+def run_warm_rerun(backend, repeat):
+    at = _check(new_session().run())
+    return [measure(backend, lambda: _check(at.run())) for _ in range(repeat)]
+
+def run_submit(backend, repeat):
+    at = _check(new_session().run())
+
+    def submit():
+        at.number_input(key="form_amount_org").set_value(123.0).run()
+        _check(next(b for b in at.button if b.label == "確認送出記帳").click().run())
+    return [measure(backend, submit) for _ in range(repeat)]
+
+def run_recurring(backend, repeat, pending_rules=5):
+    import fake_gspread
+    samples = []
+    for _ in range(repeat):
+        ss = backend.spreadsheets[SHEET_TITLE]
+        rules = fake_gspread.make_recurring(pending_rules)
+        ss._worksheets["Recurring"].rows = rules
+        # app 以 UTC+8 判斷到期；每條到期規則只能補登一次
+        today = datetime.now(timezone(timedelta(hours=8)))
+        due = sum(1 for r in rules[1:] if int(r[0]) <= today.day and r[8] != today.strftime("%Y-%m"))
+        # 超過到期條數的補登直接拒絕，否則重複補登的重跑迴圈會一直跑下去
+        tx_ws = ss._worksheets["Transactions"]
+        attempts = []
+
+        def guarded_append(values, _append=tx_ws.append_row, **kwargs):
+            attempts.append(values)
+            if len(attempts) > due:
+                raise RuntimeError("duplicate recurring append")
+            return _append(values, **kwargs)
+
+        tx_ws.append_row = guarded_append
+        clear_caches()
+        try:
+            samples.append(measure(backend, lambda: _check(new_session().run())))
+        finally:
+            del tx_ws.append_row
+        if len(attempts) != due:
+            raise RuntimeError(f"recurring_run 補登了 {len(attempts)} 筆，到期規則只有 {due} 條")
+    return samples
+
+def run_settings_save(backend, repeat):
+    at = _check(new_session().run())
+
+    def save():
+        _check(next(b for b in at.button if b.label == "💾 儲存所有設定").click().run())
+    return [measure(backend, save) for _ in range(repeat)]
+
+RUNNERS = {
+    "login": run_login,
+    "cold_load": run_cold_load,
+    "warm_rerun": run_warm_rerun,
+    "submit": run_submit,
+    "recurring_run": run_recurring,
+    "settings_save": run_settings_save,
+}
+
+def run_fresh(scenario, rows, args):
+    # 全新的 Python 行程，量「剛開機的容器」第一次畫面完成的時間
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", scenario, "--sizes", str(rows),
+           "--latency", str(args.latency), "--latency-per-1k-cells", str(args.latency_per_1k_cells)]
+    t0 = time.perf_counter()
+    out = subprocess.run(cmd, capture_output=True, text=True, check=True, cwd=ROOT)
+    sample = json.loads(out.stdout.strip().splitlines()[-1])
+    sample["process_seconds"] = time.perf_counter() - t0
+    return [sample]
+
+def child_main(scenario, rows, args):
+    from streamlit.testing.v1 import AppTest  # noqa: F401  (載入測試框架本身不算在 app 的時間內)
+    if scenario == "fresh_login":
+        # 登入畫面不連線，不進 offline() 以免先 import 了 pandas / gspread
+        t0 = time.perf_counter()
+        _check(new_session(sheet=None).run())
+        sample = {"seconds": time.perf_counter() - t0, "api_calls": 0, "stages": {}}
+    else:
+        # 含 pandas / gspread 的 import 時間，這也是剛開機的容器要付的
+        t0 = time.perf_counter()
+        import fake_gspread
+        backend = fake_gspread.make_backend(rows, latency=args.latency, latency_per_1k_cells=args.latency_per_1k_cells)
+        with offline(backend):
+            sample = measure(backend, lambda: _check(new_session().run()))
+        sample["seconds"] = time.perf_counter() - t0
+    print(json.dumps(sample))
+
+# ==========================================
+# 結果紀錄
+# ==========================================
+def summarize(scenario, rows, samples):
+    seconds = [s["seconds"] for s in samples]
+    stage_names = set().union(*(s["stages"] for s in samples))
+    stages = {k: statistics.mean(s["stages"].get(k, 0.0) for s in samples) for k in stage_names}
+    top = dict(sorted(stages.items(), key=lambda kv: kv[1], reverse=True)[:8])
+    result = {
+        "scenario": scenario,
+        "rows": rows,
+        "samples": len(samples),
+        "median_s": round(statistics.median(seconds), 4),
+        "min_s": round(min(seconds), 4),
+        "api_calls": round(statistics.mean(s["api_calls"] for s in samples), 1),
+        "stages": {k: round(v, 4) for k, v in top.items()},
+    }
+    if "process_seconds" in samples[0]:
+        result["process_s"] = round(samples[0]["process_seconds"], 4)
+    return result
+
+def _git_commit():
+    # 有未提交的修改就標上 -dirty，結果才對得到實際跑的程式碼 (history 檔本身不算)
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=ROOT, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no", "--", ".", ":(exclude)bench/results"],
+                                capture_output=True, text=True, cwd=ROOT, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+    return f"{commit}-dirty" if status else commit
+
+def _versions():
+    import pandas as pd
+    import streamlit as st
+    return {"python": platform.python_version(), "pandas": pd.__version__, "streamlit": st.__version__}
+
+def load_previous(path, config):
+    if not os.path.exists(path):
+        return {}
+    previous = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            entry = json.loads(line)
+            if entry.get("config") != config:
+                continue
+            for r in entry["results"]:
+                previous[(r["scenario"], r["rows"])] = r
+    return previous
+
+def print_table(results, previous):
+    print(f"{'scenario':<16}{'rows':>8}{'median s':>11}{'min s':>9}{'api':>7}{'vs prev':>10}  top stages")
+    for r in results:
+        prev = previous.get((r["scenario"], r["rows"]))
+        delta = f"{(r['median_s'] - prev['median_s']) / prev['median_s'] * 100:+.1f}%" if prev and prev["median_s"] else "-"
+        top = ", ".join(f"{k}={v:.3f}" for k, v in list(r["stages"].items())[:3])
+        print(f"{r['scenario']:<16}{r['rows']:>8}{r['median_s']:>11.4f}{r['min_s']:>9.4f}{r['api_calls']:>7}{delta:>10}  {top}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark for the expense tracker app")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--scenarios", nargs="+", default=SCENARIOS + FRESH_SCENARIOS, choices=SCENARIOS + FRESH_SCENARIOS)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.0, help="每次 API 呼叫的延遲秒數")
+    parser.add_argument("--latency-per-1k-cells", type=float, default=0.0, help="每 1000 格資料的額外延遲秒數")
+    parser.add_argument("--quota", type=int, default=None, help="每分鐘 API 呼叫上限，超過會丟 429")
+    parser.add_argument("--history", default=DEFAULT_HISTORY)
+    parser.add_argument("--no-save", action="store_true")
+    parser.add_argument("--child", choices=FRESH_SCENARIOS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child_main(args.child, args.sizes[0], args)
+
+    config = {"latency": args.latency, "latency_per_1k_cells": args.latency_per_1k_cells, "quota": args.quota, "repeat": args.repeat}
+    results = []
+    for rows in args.sizes:
+        for scenario in args.scenarios:
+            if scenario in FRESH_SCENARIOS:
+                samples = run_fresh(scenario, rows, args)
+            else:
+                import fake_gspread
+                backend = fake_gspread.make_backend(rows, latency=args.latency,
+                                                    latency_per_1k_cells=args.latency_per_1k_cells, quota_per_minute=args.quota)
+                clear_caches()
+                with offline(backend):
+                    samples = RUNNERS[scenario](backend, args.repeat)
+            results.append(summarize(scenario, rows, samples))
+            print(f"  {scenario} @ {rows} rows: {results[-1]['median_s']:.4f}s", file=sys.stderr)
+
+    previous = load_previous(args.history, config)
+    print_table(results, previous)
+    if not args.no_save:
+        os.makedirs(os.path.dirname(args.history), exist_ok=True)
+        entry = {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "versions": _versions(),
+            "config": config,
+            "results": results,
+        }
+        if entry["commit"].endswith("-dirty"):
+            print("注意：工作目錄有未提交的修改，這筆結果標為 -dirty", file=sys.stderr)
+        with open(args.history, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+if __name__ == "__main__":
+    main()
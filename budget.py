@@ -0,0 +1,96 @@
+import calendar
+import numpy as np
+import pandas as pd
+from rates import calculate_exchange
+
+# ==========================================
+# 預算與月底預測：逐日支出曲線 + 已知的固定支出
+# ==========================================
+def _days_in_month(month_str):
+    year, month = map(int, month_str.split("-"))
+    return calendar.monthrange(year, month)[1]
+
+def _is_auto_note(note):
+    return str(note).startswith("(自動)")
+
+def build_burn(df, month_str):
+    # 每個大類一條逐日支出曲線；fixed 為固定收支自動補登的部分 (不計入日均花費)
+    burn = {}
+    if df.empty or "Date" not in df.columns:
+        return burn
+    dates = pd.to_datetime(df["Date"], errors='coerce')
+    mask = (dates.dt.strftime('%Y-%m') == month_str) & (df["Type"] != "收入")
+    month_df = df[mask]
+    if month_df.empty:
+        return burn
+
+    days = _days_in_month(month_str)
+    day_idx = dates[mask].dt.day.to_numpy() - 1
+    amounts = pd.to_numeric(month_df["Amount_Def"], errors='coerce').fillna(0).to_numpy(dtype=float)
+    auto = month_df["Note"].map(_is_auto_note).to_numpy(dtype=bool)
+    for cat, pos in month_df.groupby("Main_Category").indices.items():
+        daily = np.zeros(days)
+        fixed = np.zeros(days)
+        np.add.at(daily, day_idx[pos], amounts[pos])
+        np.add.at(fixed, day_idx[pos][auto[pos]], amounts[pos][auto[pos]])
+        burn[str(cat)] = {"daily": daily, "fixed": fixed}
+    return burn
+
+def add_to_burn(burn_cache, record):
+    # 新增一筆交易時只更新對應的那一天，不重算整本帳
+    tx_date = pd.to_datetime(record.get("Date"), errors='coerce')
+    if pd.isna(tx_date) or record.get("Type") == "收入":
+        return
+    month_str = tx_date.strftime('%Y-%m')
+    if month_str not in burn_cache:
+        return
+    amount = pd.to_numeric(record.get("Amount_Def"), errors='coerce')
+    if pd.isna(amount):
+        return
+    days = _days_in_month(month_str)
+    curve = burn_cache[month_str].setdefault(str(record.get("Main_Category")), {"daily": np.zeros(days), "fixed": np.zeros(days)})
+    curve["daily"][tx_date.day - 1] += amount
+    if _is_auto_note(record.get("Note", "")):
+        curve["fixed"][tx_date.day - 1] += amount
+
+def upcoming_recurring(rec_df, today, target_currency, rates):
+    # 本月尚未執行的固定支出，視為已知的未來支出
+    upcoming = {}
+    if rec_df.empty:
+        return upcoming
+    month_str = today.strftime("%Y-%m")
+    for _, row in rec_df.iterrows():
+        try:
+            if row['Type'] == "收入" or str(row['Last_Run_Month']).strip() == month_str:
+                continue
+            if int(row['Day']) <= today.day or int(row['Day']) > _days_in_month(month_str):
+                continue
+            amt, _ = calculate_exchange(float(row['Amount_Original']), row['Currency'], target_currency, rates)
+            upcoming[str(row['Main_Category'])] = upcoming.get(str(row['Main_Category']), 0.0) + amt
+        except (ValueError, TypeError):
+            continue
+    return upcoming
+
+def forecast_month_end(burn, upcoming, budget_map, today):
+    days = _days_in_month(today.strftime("%Y-%m"))
+    elapsed = min(today.day, days)
+    forecast = {}
+    for cat in set(budget_map) | set(burn) | set(upcoming):
+        spent, daily_rate = 0.0, 0.0
+        curve = burn.get(cat)
+        if curve:
+            # 以至今日的非固定支出累積曲線估算日均花費
+            spent = float(curve["daily"].sum())
+            daily_rate = float(np.cumsum(curve["daily"] - curve["fixed"])[elapsed - 1]) / elapsed
+        projected = spent + daily_rate * (days - elapsed) + upcoming.get(cat, 0.0)
+        forecast[cat] = {"spent": spent, "projected": projected, "budget": budget_map.get(cat)}
+    return forecast
+
+def budget_message(cat, f):
+    if not f["budget"]:
+        return None
+    if f["spent"] > f["budget"]:
+        return f"{cat} 本月已支出 ${f['spent']:,.0f}，超出預算 ${f['budget']:,.0f}"
+    if f["projected"] > f["budget"]:
+        return f"照目前速度，{cat} 月底預估 ${f['projected']:,.0f}，將超出預算 ${f['budget']:,.0f}"
+    return None
@@ -0,0 +1,56 @@
+import os
+import streamlit as st
+
+# ==========================================
+# 登入畫面 (不載入 pandas / gspread，開站第一個畫面要快)
+# ==========================================
+TEMPLATE_URL = "https://docs.google.com/spreadsheets/d/1XyZ_example_ID_copy/copy"
+
+def bot_email():
+    try:
+        if "gcp_service_account" in st.secrets:
+            return st.secrets["gcp_service_account"]["client_email"]
+    except Exception:
+        pass
+    return None
+
+def is_admin():
+    try:
+        token = st.secrets.get("admin_token")
+    except Exception:
+        token = None
+    token = token or os.environ.get("ADMIN_TOKEN")
+    return bool(token) and st.query_params.get("admin") == token
+
+def show_login_screen():
+    email = bot_email() or "尚未設定 Secrets"
+
+    st.markdown("""
+    <div class="login-container">
+        <h2 style="margin-bottom: 20px;">👋 歡迎使用記帳本</h2>
+    """, unsafe_allow_html=True)
+
+    col_L, col_R = st.columns([1, 1])
+    with col_L:
+        st.info("我是新使用者")
+        st.markdown("<div class='step-text'>1. 下載專屬範本</div>", unsafe_allow_html=True)
+        if "http" in TEMPLATE_URL:
+            st.link_button("📄 建立副本", TEMPLATE_URL, type="primary", use_container_width=True)
+        else:
+            st.warning("⚠️ 未設定範本連結")
+        st.markdown("<div class='step-text'>2. 共用給機器人：</div>", unsafe_allow_html=True)
+        st.code(email, language="text")
+
+    with col_R:
+        st.success("我已經準備好了")
+        st.markdown("<div class='step-text'>3. 輸入 <b>Google Sheet 網址</b></div>", unsafe_allow_html=True)
+        sheet_input = st.text_input("連結或名稱", placeholder="https://docs.google.com/...")
+
+        st.markdown("<br>", unsafe_allow_html=True)
+        if st.button("🚀 連接帳本", type="primary", use_container_width=True):
+            if sheet_input:
+                st.session_state.current_sheet_name = sheet_input.strip()
+                st.rerun()
+            else:
+                st.warning("請輸入內容")
+    st.markdown("</div>", unsafe_allow_html=True)
@@ -0,0 +1,38 @@
+import streamlit as st
+import pandas as pd
+import tracing
+
+# ==========================================
+# 匯率處理：臺灣銀行牌告匯率 (read_html / lxml 只在快取過期時載入)
+# ==========================================
+RATES_URL = "https://rate.bot.com.tw/xrt?Lang=zh-TW"
+
+@st.cache_data(ttl=3600)
+def get_exchange_rates():
+    tracing.cache_miss()
+    try:
+        with tracing.stage("rates.read_html"):
+            dfs = pd.read_html(RATES_URL)
+        df = dfs[0]
+        df = df.iloc[:, 0:5]
+        df.columns = ["Currency_Name", "Cash_Buy", "Cash_Sell", "Spot_Buy", "Spot_Sell"]
+        df["Currency"] = df["Currency_Name"].str.extract(r'\(([A-Z]+)\)')
+        rates = df.dropna(subset=['Currency']).copy()
+        rates["Spot_Sell"] = pd.to_numeric(rates["Spot_Sell"], errors='coerce')
+        rate_dict = rates.set_index("Currency")["Spot_Sell"].to_dict()
+        rate_dict["TWD"] = 1.0
+        return rate_dict
+    except:
+        return {}
+
+def calculate_exchange(amount, input_currency, target_currency, rates):
+    if input_currency == target_currency: return amount, 1.0
+    try:
+        rate_in = rates.get(input_currency)
+        rate_target = rates.get(target_currency)
+        if not rate_in or not rate_target: return amount, 0
+        conversion_factor = rate_in / rate_target
+        exchanged_amount = amount * conversion_factor
+        return round(exchanged_amount, 2), conversion_factor
+    except:
+        return amount, 0
@@ -0,0 +1,56 @@
+import streamlit as st
+from datetime import datetime, timedelta, timezone
+import time
+import sheets
+from rates import calculate_exchange
+
+# ==========================================
+# 固定收支：每個 session 檢查一次，補登本月到期的規則
+# ==========================================
+SYS_TZ = timezone(timedelta(hours=8))
+
+def check_and_run_recurring(source_str, default_currency, rates):
+    if 'recurring_checked' in st.session_state:
+        return
+
+    rec_df = sheets.get_data("Recurring", source_str)
+    if rec_df.empty: return
+
+    today = datetime.now(SYS_TZ)
+    current_month_str = today.strftime("%Y-%m")
+    current_day = today.day
+
+    # 先標記已檢查：就算中途失敗，也不會在之後每次重跑時重複補登
+    st.session_state['recurring_checked'] = True
+    executed_count = 0
+
+    for _, row in rec_df.iterrows():
+        try:
+            last_run = str(row['Last_Run_Month']).strip()
+            scheduled_day = int(row['Day'])
+
+            if last_run != current_month_str and current_day >= scheduled_day:
+                amt_org = float(row['Amount_Original'])
+                curr = row['Currency']
+                amt_target, _ = calculate_exchange(amt_org, curr, default_currency, rates)
+
+                tx_date = today.strftime("%Y-%m-%d")
+                tx_row = [tx_date, row['Type'], row['Main_Category'], row['Sub_Category'], row['Payment_Method'], curr, amt_org, amt_target, f"(自動) {row['Note']}", str(datetime.now(SYS_TZ))]
+
+                # 先用版本號認領本月這一筆 (寫入 Last_Run_Month)，成功才補登交易；
+                # 兩個 session 同時檢查時，只有一個認領得到，沒認領到的規則就換下一條
+                if not sheets.update_recurring_last_run(row['ID'], row['Version'], current_month_str, source_str, quiet=True):
+                    continue
+                if sheets.append_data("Transactions", tx_row, source_str):
+                    executed_count += 1
+                else:
+                    # 補登失敗 (通常是連線問題) 就還原認領並停止，下次開啟時再試
+                    sheets.update_recurring_last_run(row['ID'], int(float(row['Version'])) + 1, last_run, source_str)
+                    break
+        except Exception:
+            continue
+
+    if executed_count > 0:
+        st.toast(f"🤖 自動補登了 {executed_count} 筆固定收支！", icon="✅")
+        time.sleep(1)
+        st.rerun()
@@ -0,0 +1,106 @@
+import os
+import tempfile
+import time
+import pandas as pd
+import analytics
+
+# ==========================================
+# 報表匯出：分批寫出，不在記憶體中組整本活頁簿
+# ==========================================
+CHUNK_ROWS = 5000
+EXPORT_DIR = os.path.join(tempfile.gettempdir(), "expense_exports")
+HIDDEN_COLS = ["Version"]
+EXPORT_MAX_AGE = 6 * 3600  # 匯出檔保留 6 小時，之後由下一次匯出順便清掉
+
+def filter_period(df, start_month=None, end_month=None):
+    if df.empty or not start_month or "Date" not in df.columns:
+        return df
+    months = pd.to_datetime(df["Date"], errors='coerce').to_numpy().astype("datetime64[M]").astype(str)
+    return df[(months >= start_month) & (months <= end_month)]
+
+def _cell(value):
+    if value is None or pd.isna(value):
+        return None
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+def _iter_chunks(df):
+    for start in range(0, len(df), CHUNK_ROWS):
+        yield df.iloc[start:start + CHUNK_ROWS]
+
+def _export_frame(df):
+    return df[[c for c in df.columns if c not in HIDDEN_COLS]]
+
+def _append_frame(ws, frame, index_name):
+    ws.append([index_name] + [str(c) for c in frame.columns])
+    for label, values in zip(frame.index, frame.itertuples(index=False, name=None)):
+        ws.append([label] + [_cell(v) for v in values])
+
+def write_xlsx(path, df, progress=None):
+    from openpyxl import Workbook
+
+    # write_only 模式逐列寫入暫存檔，大帳本也不會整本留在記憶體
+    wb = Workbook(write_only=True)
+    raw = _export_frame(df)
+    ws = wb.create_sheet("Transactions")
+    ws.append(list(raw.columns))
+    for chunk in _iter_chunks(raw):
+        for values in chunk.itertuples(index=False, name=None):
+            ws.append([_cell(v) for v in values])
+        if progress is not None: progress["rows"] += len(chunk)
+
+    series = analytics.build_series(analytics.prepare_ledger(df))
+    _append_frame(wb.create_sheet("Monthly"), series["monthly"], "Month")
+    _append_frame(wb.create_sheet("Category"), series["by_category"], "Month")
+    _append_frame(wb.create_sheet("Payment"), series["by_payment"], "Month")
+    wb.save(path)
+
+def write_csv(path, df, progress=None):
+    raw = _export_frame(df)
+    # utf-8-sig 讓 Excel 正確顯示中文
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        if raw.empty:
+            raw.to_csv(f, index=False)
+        for i, chunk in enumerate(_iter_chunks(raw)):
+            chunk.to_csv(f, header=(i == 0), index=False)
+            if progress is not None: progress["rows"] += len(chunk)
+
+EXPORT_FORMATS = {
+    "XLSX": (write_xlsx, ".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "CSV": (write_csv, ".csv", "text/csv"),
+}
+
+def cleanup_exports(max_age=EXPORT_MAX_AGE):
+    # 各 session 留下的舊匯出檔，依修改時間清除
+    cutoff = time.time() - max_age
+    try:
+        entries = list(os.scandir(EXPORT_DIR))
+    except OSError:
+        return
+    for entry in entries:
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+def read_export(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+def run_export(fmt, df, file_stem, start_month=None, end_month=None, progress=None):
+    writer, ext, mime = EXPORT_FORMATS[fmt]
+    df = filter_period(df, start_month, end_month)
+    if progress is not None: progress["total"] = len(df)
+
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    cleanup_exports()
+    fd, path = tempfile.mkstemp(suffix=ext, dir=EXPORT_DIR)
+    os.close(fd)
+    try:
+        writer(path, df, progress)
+    except Exception:
+        os.remove(path)
+        raise
+    return {"path": path, "file_name": file_stem + ext, "mime": mime, "rows": len(df)}
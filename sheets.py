@@ -0,0 +1,404 @@
+import streamlit as st
+import pandas as pd
+import gspread
+from datetime import date, datetime
+import time
+import re
+import bisect
+import threading
+import uuid
+from gspread.utils import numericise, rowcol_to_a1
+import tracing
+from budget import add_to_burn, build_burn
+
+# ==========================================
+# Google Sheets 連線
+# ==========================================
+@st.cache_resource
+def get_gspread_client():
+    scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+    # oauth2client 只在第一次建立連線時載入
+    from oauth2client.service_account import ServiceAccountCredentials
+
+    creds = None
+    try:
+        if "gcp_service_account" in st.secrets:
+            creds_dict = st.secrets["gcp_service_account"]
+            creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
+    except Exception:
+        pass
+    if creds is None:
+        try:
+            creds = ServiceAccountCredentials.from_json_keyfile_name("service_account.json", scope)
+        except FileNotFoundError:
+            return None
+    return tracing.instrument_client(gspread.authorize(creds))
+
+def open_spreadsheet(client, source_str):
+    if source_str.startswith("http"):
+        return tracing.open_traced(client.open_by_url, source_str)
+    else:
+        return tracing.open_traced(client.open, source_str)
+
+# ==========================================
+# 資料讀寫函式 (快取時間 5 分鐘，寫入時就地更新)
+# ==========================================
+DATA_TTL = 300
+
+# 有穩定 ID 的工作表：基本欄位 + ID / Version
+SHEET_COLUMNS = {
+    "Transactions": ["Date", "Type", "Main_Category", "Sub_Category", "Payment_Method", "Currency", "Amount_Original", "Amount_Def", "Note", "Timestamp"],
+    "Recurring": ["Day", "Type", "Main_Category", "Sub_Category", "Payment_Method", "Currency", "Amount_Original", "Note", "Last_Run_Month", "Status"],
+}
+
+# 一律當文字讀的欄位：ID 像 "012345678901" / "292571311e40" 會被轉成數字，備註 "007" 也要原樣保留
+TEXT_COLS = ("ID", "Note")
+
+class RowConflictError(Exception):
+    pass
+
+@st.cache_resource
+def get_sheet_store():
+    # (source, worksheet) -> 已載入的表格、ID→列號索引與資料版本
+    # lock 只在讀取 / 修補快取時短暫持有；write_locks 讓同一張表的寫入依序進行 (網路 I/O 在這裡面)
+    return {"lock": threading.RLock(), "tables": {}, "write_locks": {}, "seq": 0}
+
+def _write_lock(worksheet_name, source_str):
+    store = get_sheet_store()
+    with store["lock"]:
+        return store["write_locks"].setdefault((source_str, worksheet_name), threading.Lock())
+
+def _next_version(store):
+    store["seq"] += 1
+    return store["seq"]
+
+def new_row_id():
+    return uuid.uuid4().hex[:12]
+
+def _to_cell(value):
+    if value is None or (not isinstance(value, (list, dict)) and pd.isna(value)):
+        return ""
+    if hasattr(value, "item"):
+        return value.item()
+    if isinstance(value, (date, datetime)):
+        return str(value)
+    return value
+
+def cell_text(value):
+    # 比對用：123、123.0 與 "123" 視為相同，空白 / NaN 視為 ""
+    value = _to_cell(value)
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+def _to_version(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+def _first_cell(value_range):
+    return str(value_range[0][0]).strip() if value_range and value_range[0] else ""
+
+def _read_records(worksheet):
+    df = pd.DataFrame(worksheet.get_all_records(numericise_ignore=["all"]))
+    for col in df.columns:
+        if col not in TEXT_COLS:
+            df[col] = [numericise(v) for v in df[col]]
+    return df
+
+def ensure_row_ids(worksheet, df, base_cols):
+    if not df.empty and {"ID", "Version"} <= set(df.columns):
+        if (df["ID"].astype(str) != "").all() and (df["Version"].astype(str) != "").all():
+            return df
+
+    # 補齊標題列 (舊帳本沒有 ID / Version 欄)
+    header = worksheet.row_values(1)
+    new_header = list(header) + base_cols[len(header):]
+    for name in ("ID", "Version"):
+        if name not in new_header:
+            new_header.append(name)
+    if new_header != header:
+        if len(new_header) > worksheet.col_count:
+            worksheet.add_cols(len(new_header) - worksheet.col_count)
+        worksheet.update(values=[new_header], range_name="A1")
+        df = _read_records(worksheet)
+    for col in new_header:
+        if col not in df.columns: df[col] = ""
+
+    # 為沒有 ID 的舊資料補上 ID，一次寫回
+    if not df.empty:
+        missing_id = df["ID"].astype(str) == ""
+        missing_ver = df["Version"].astype(str) == ""
+        if missing_id.any() or missing_ver.any():
+            df["ID"] = [new_row_id() if m else str(v) for v, m in zip(df["ID"], missing_id)]
+            df["Version"] = [1 if m else v for v, m in zip(df["Version"], missing_ver)]
+            last_row = len(df) + 1
+            id_col = new_header.index("ID") + 1
+            ver_col = new_header.index("Version") + 1
+            worksheet.batch_update([
+                {"range": f"{rowcol_to_a1(2, id_col)}:{rowcol_to_a1(last_row, id_col)}", "values": [[v] for v in df["ID"]]},
+                {"range": f"{rowcol_to_a1(2, ver_col)}:{rowcol_to_a1(last_row, ver_col)}", "values": [[_to_cell(v)] for v in df["Version"]]},
+            ])
+    return df
+
+def _load_table(worksheet_name, source_str):
+    client = get_gspread_client()
+    sheet = open_spreadsheet(client, source_str)
+    worksheet = sheet.worksheet(worksheet_name)
+    df = _read_records(worksheet)
+
+    if worksheet_name in SHEET_COLUMNS:
+        df = ensure_row_ids(worksheet, df, SHEET_COLUMNS[worksheet_name])
+    header = list(df.columns)
+
+    if worksheet_name == "Settings":
+        required_cols = ["Main_Category", "Sub_Category", "Payment_Method", "Currency", "Default_Currency", "Budget_Category", "Budget_Amount"]
+        for col in required_cols:
+            if col not in df.columns: df[col] = ""
+
+    if worksheet_name == "Recurring":
+        required_cols = ["Day", "Type", "Main_Category", "Sub_Category", "Payment_Method", "Currency", "Amount_Original", "Note", "Last_Run_Month"]
+        for col in required_cols:
+            if col not in df.columns: df[col] = ""
+
+    row_index = {}
+    if "ID" in df.columns:
+        row_index = {str(rid): pos + 2 for pos, rid in enumerate(df["ID"])}
+
+    # 移除完全空白的行
+    if not df.empty:
+        df = df.dropna(how='all')
+
+    entry = {"df": df, "header": header, "row_index": row_index, "sheet": sheet, "worksheet": worksheet, "loaded_at": time.time()}
+    if "ID" in header:
+        entry["id_col"] = header.index("ID") + 1
+        entry["ver_col"] = header.index("Version") + 1
+    return entry
+
+def _get_table(worksheet_name, source_str):
+    store = get_sheet_store()
+    key = (source_str, worksheet_name)
+    with store["lock"]:
+        seen = store["tables"].get(key)
+        if seen is not None and time.time() - seen["loaded_at"] < DATA_TTL:
+            tracing.record_cache(f"get_data:{worksheet_name}", True)
+            return seen
+        seen_version = seen["version"] if seen else None
+    tracing.record_cache(f"get_data:{worksheet_name}", False)
+    with tracing.stage(f"load.{worksheet_name}"):
+        entry = _load_table(worksheet_name, source_str)
+    with store["lock"]:
+        entry["version"] = _next_version(store)
+        current = store["tables"].get(key)
+        if current is seen and (seen is None or seen["version"] == seen_version):
+            store["tables"][key] = entry
+        elif current is not None:
+            # 讀取期間別的 session 已重新載入或寫入過 (例如剛新增一筆)，用它的版本，不蓋掉較新的資料
+            return current
+    return entry
+
+def get_data(worksheet_name, source_str):
+    try:
+        entry = _get_table(worksheet_name, source_str)
+        with get_sheet_store()["lock"]:
+            return entry["df"].copy()
+    except Exception:
+        return pd.DataFrame()
+
+def get_data_version(worksheet_name, source_str):
+    entry = get_sheet_store()["tables"].get((source_str, worksheet_name))
+    return entry["version"] if entry else 0
+
+def invalidate_data(worksheet_name, source_str):
+    store = get_sheet_store()
+    with store["lock"]:
+        store["tables"].pop((source_str, worksheet_name), None)
+
+def clear_data_cache():
+    store = get_sheet_store()
+    with store["lock"]:
+        store["tables"].clear()
+    st.cache_data.clear()
+
+def append_data(worksheet_name, row_data, source_str):
+    try:
+        if worksheet_name not in SHEET_COLUMNS:
+            client = get_gspread_client()
+            sheet = open_spreadsheet(client, source_str)
+            sheet.worksheet(worksheet_name).append_row(row_data)
+            invalidate_data(worksheet_name, source_str)
+            return True
+
+        with _write_lock(worksheet_name, source_str):
+            entry = _get_table(worksheet_name, source_str)
+            header = entry["header"]
+            row_id = new_row_id()
+            values = list(row_data) + [""] * (len(header) - len(row_data))
+            values[entry["id_col"] - 1] = row_id
+            values[entry["ver_col"] - 1] = 1
+            res = entry["worksheet"].append_row([_to_cell(v) for v in values])
+
+            # 依回傳的範圍 (例如 Transactions!A12:L12) 更新索引，不需重新讀取
+            store = get_sheet_store()
+            with store["lock"]:
+                match = re.search(r"![A-Z]+(\d+)", res.get("updates", {}).get("updatedRange", ""))
+                if match:
+                    entry["row_index"][row_id] = int(match.group(1))
+                    new_row = pd.DataFrame([dict(zip(header, values))])
+                    entry["df"] = pd.concat([entry["df"], new_row], ignore_index=True)
+                    entry["version"] = _next_version(store)
+                    if "burn" in entry:
+                        add_to_burn(entry["burn"], dict(zip(header, values)))
+                else:
+                    store["tables"].pop((source_str, worksheet_name), None)
+        return True
+    except Exception as e:
+        st.error(f"寫入錯誤: {e}")
+        return False
+
+def _verify_rows(worksheet, entry, expected):
+    # 確認每個 ID 仍在索引記錄的列上、且版本沒被別人改過
+    for attempt in range(2):
+        rows = {rid: entry["row_index"].get(rid) for rid in expected}
+        if None not in rows.values():
+            ranges = []
+            for r in rows.values():
+                ranges += [rowcol_to_a1(r, entry["id_col"]), rowcol_to_a1(r, entry["ver_col"])]
+            cells = worksheet.batch_get(ranges)
+            shifted = False
+            for i, (rid, version) in enumerate(expected.items()):
+                if _first_cell(cells[2 * i]) != rid:
+                    shifted = True
+                    break
+                if _to_version(_first_cell(cells[2 * i + 1])) != _to_version(version):
+                    raise RowConflictError("這筆資料已被其他人修改，請重新同步後再試。")
+            if not shifted:
+                return rows
+        if attempt == 0:
+            # 列被移動過 (例如別人刪除了資料)，只讀 ID 欄重建索引
+            ids = worksheet.col_values(entry["id_col"])
+            row_index = {str(v): i + 1 for i, v in enumerate(ids) if i > 0 and v}
+            store = get_sheet_store()
+            with store["lock"]:
+                # 表格內容變了：版本號要跟著換，衍生的序列與支出曲線才不會沿用舊的列
+                entry["row_index"] = row_index
+                entry["df"] = entry["df"][entry["df"]["ID"].astype(str).isin(row_index)]
+                entry["version"] = _next_version(store)
+                entry.pop("burn", None)
+    raise RowConflictError("找不到這筆資料，可能已被刪除。")
+
+def apply_row_changes(worksheet_name, source_str, edits=None, deletes=None, quiet=False):
+    # edits: {row_id: (version, {欄位: 新值})}，deletes: {row_id: version}
+    # quiet: 版本衝突時不顯示錯誤 (例如固定收支已被其他 session 認領)
+    edits = {str(rid): v for rid, v in (edits or {}).items()}
+    deletes = {str(rid): v for rid, v in (deletes or {}).items()}
+    expected = {rid: version for rid, (version, _) in edits.items()}
+    expected.update(deletes)
+    if not expected:
+        return True
+
+    store = get_sheet_store()
+    try:
+        # 網路 I/O 只在這張表的寫入鎖內進行，不會擋住其他 session 的讀取
+        with _write_lock(worksheet_name, source_str):
+            entry = _get_table(worksheet_name, source_str)
+            header = entry["header"]
+            worksheet = entry["worksheet"]
+            rows = _verify_rows(worksheet, entry, expected)
+
+            # 只寫回有變動的儲存格與 Version，其他欄位的格式保持原樣
+            updates = []
+            for rid, (version, changes) in edits.items():
+                for col, val in {**changes, "Version": _to_version(version) + 1}.items():
+                    if col in header:
+                        updates.append({"range": rowcol_to_a1(rows[rid], header.index(col) + 1), "values": [[_to_cell(val)]]})
+            if updates:
+                worksheet.batch_update(updates)
+
+            if deletes:
+                # 由下往上刪，一次 API 呼叫完成
+                del_rows = sorted((rows[rid] for rid in deletes), reverse=True)
+                entry["sheet"].batch_update({"requests": [
+                    {"deleteDimension": {"range": {"sheetId": worksheet.id, "dimension": "ROWS", "startIndex": r - 1, "endIndex": r}}}
+                    for r in del_rows
+                ]})
+
+            # 就地更新快取與索引
+            with store["lock"]:
+                # 不改動原本的 df：其他 session 可能正拿著它在鎖外計算
+                df = entry["df"].copy() if edits else entry["df"]
+                ids = df["ID"].astype(str)
+                for rid, (version, changes) in edits.items():
+                    mask = ids == rid
+                    for col, val in {**changes, "Version": _to_version(version) + 1}.items():
+                        if col in df.columns:
+                            df[col] = df[col].where(~mask, val)
+                if deletes:
+                    df = df[~ids.isin(deletes)]
+                    for rid in deletes:
+                        entry["row_index"].pop(rid, None)
+                    del_rows.reverse()
+                    for rid, r in entry["row_index"].items():
+                        entry["row_index"][rid] = r - bisect.bisect_left(del_rows, r)
+                entry["df"] = df
+                entry["version"] = _next_version(store)
+                entry.pop("burn", None)
+        return True
+    except RowConflictError as e:
+        invalidate_data(worksheet_name, source_str)
+        if not quiet:
+            st.error(f"⚠️ {e}")
+        return False
+    except Exception as e:
+        # 寫到一半失敗時不知道試算表實際的狀態，下次重新讀取
+        invalidate_data(worksheet_name, source_str)
+        st.error(f"寫入錯誤: {e}")
+        return False
+
+def save_settings_data(new_settings_df, source_str):
+    client = get_gspread_client()
+    try:
+        sheet = open_spreadsheet(client, source_str)
+        worksheet = sheet.worksheet("Settings")
+        worksheet.clear()
+        new_settings_df = new_settings_df.fillna("")
+        data_to_write = [new_settings_df.columns.values.tolist()] + new_settings_df.values.tolist()
+        worksheet.update(values=data_to_write)
+        invalidate_data("Settings", source_str)
+        return True
+    except Exception as e:
+        st.error(f"儲存設定失敗: {e}")
+        return False
+
+def update_recurring_last_run(rule_id, version, month_str, source_str, quiet=False):
+    return apply_row_changes("Recurring", source_str, edits={rule_id: (version, {"Last_Run_Month": month_str})}, quiet=quiet)
+
+def delete_recurring_rule(rule_id, version, source_str):
+    return apply_row_changes("Recurring", source_str, deletes={rule_id: version})
+
+def get_month_burn(source_str, month_str):
+    try:
+        entry = _get_table("Transactions", source_str)
+    except Exception:
+        return {}
+    with get_sheet_store()["lock"]:
+        burn_cache = entry.setdefault("burn", {})
+        if month_str not in burn_cache:
+            burn_cache[month_str] = build_burn(entry["df"], month_str)
+        return {cat: {k: v.copy() for k, v in curve.items()} for cat, curve in burn_cache[month_str].items()}
+
+def get_derived(worksheet_name, source_str, name, build):
+    # 由表格算出的唯讀結果 (例如分析序列)，跟著資料版本失效；各 session 共用同一份，不經 pickle
+    entry = _get_table(worksheet_name, source_str)
+    store = get_sheet_store()
+    with store["lock"]:
+        cached = entry.setdefault("derived", {}).get(name)
+        if cached is not None and cached[0] == entry["version"]:
+            return cached[1]
+        version, df = entry["version"], entry["df"]
+    result = build(df)
+    with store["lock"]:
+        if entry["version"] == version:
+            entry["derived"][name] = (version, result)
+    return result
@@ -0,0 +1,234 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# ==========================================
+# 效能追蹤：每次重跑的階段耗時、Google API 呼叫次數 / 位元組、快取命中
+# ==========================================
+logger = logging.getLogger("expense_tracker.trace")
+if not logger.handlers:
+    _handler = logging.StreamHandler(sys.stderr)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(os.environ.get("TRACE_LOG_LEVEL", "INFO"))
+    logger.propagate = False
+
+SPREADSHEET_SCOPE = "(spreadsheet)"
+
+_local = threading.local()
+_registry_lock = threading.Lock()
+_registry = {
+    "reruns": 0,
+    "rerun_seconds": 0.0,
+    "stages": defaultdict(lambda: [0.0, 0]),
+    "api_calls": defaultdict(int),
+    "api_bytes": defaultdict(int),
+    "cache": defaultdict(int),
+}
+
+class RunTrace:
+    def __init__(self, session_id=""):
+        self.session_id = session_id
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.seconds = None
+        self.stages = defaultdict(lambda: [0.0, 0])
+        self.api_calls = defaultdict(int)
+        self.api_bytes = defaultdict(int)
+        self.cache = defaultdict(int)
+
+    @property
+    def finished(self):
+        return self.seconds is not None
+
+    def add_stage(self, name, seconds):
+        self.stages[name][0] += seconds
+        self.stages[name][1] += 1
+
+    def to_dict(self):
+        return {
+            "event": "rerun",
+            "session": self.session_id,
+            "started_at": round(self.started_at, 3),
+            "seconds": round(self.seconds or 0.0, 4),
+            "stages": {k: {"seconds": round(s, 4), "count": n} for k, (s, n) in self.stages.items()},
+            "api_calls": [{"worksheet": ws, "method": m, "count": n} for (ws, m), n in self.api_calls.items()],
+            "api_bytes": dict(self.api_bytes),
+            "cache": [{"key": k, "result": r, "count": n} for (k, r), n in self.cache.items()],
+        }
+
+def start_run(session_id=""):
+    _local.run = RunTrace(session_id)
+    return _local.run
+
+def current():
+    return getattr(_local, "run", None)
+
+def finish_run(run):
+    if run is None or run.finished:
+        return
+    run.seconds = time.perf_counter() - run._t0
+    with _registry_lock:
+        _registry["reruns"] += 1
+        _registry["rerun_seconds"] += run.seconds
+        for name, (seconds, count) in run.stages.items():
+            _registry["stages"][name][0] += seconds
+            _registry["stages"][name][1] += count
+        for key, n in run.api_calls.items():
+            _registry["api_calls"][key] += n
+        for key, n in run.api_bytes.items():
+            _registry["api_bytes"][key] += n
+        for key, n in run.cache.items():
+            _registry["cache"][key] += n
+    logger.info(json.dumps(run.to_dict(), ensure_ascii=False))
+    _write_textfile()
+
+@contextmanager
+def stage(name):
+    run = current()
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        if run is not None:
+            run.add_stage(name, time.perf_counter() - t0)
+
+def record_cache(key, hit):
+    run = current()
+    if run is not None:
+        run.cache[(key, "hit" if hit else "miss")] += 1
+
+@contextmanager
+def cache_probe(key):
+    # 包住 st.cache_data 函式的呼叫；函式本體有執行 (cache_miss) 就算未命中
+    probes = _local.__dict__.setdefault("probes", [])
+    probes.append({"miss": False})
+    try:
+        yield
+    finally:
+        record_cache(key, not probes.pop()["miss"])
+
+def cache_miss():
+    probes = getattr(_local, "probes", None)
+    if probes:
+        probes[-1]["miss"] = True
+
+# ==========================================
+# gspread 包裝：依工作表統計呼叫次數與傳輸量
+# ==========================================
+@contextmanager
+def api_call(worksheet, method):
+    run = current()
+    previous = getattr(_local, "worksheet", None)
+    _local.worksheet = worksheet
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        _local.worksheet = previous
+        if run is not None:
+            run.api_calls[(worksheet, method)] += 1
+            run.add_stage(f"gsheets.{method}", time.perf_counter() - t0)
+
+def _record_bytes(n):
+    run = current()
+    if run is not None:
+        run.api_bytes[getattr(_local, "worksheet", None) or SPREADSHEET_SCOPE] += n
+
+class _Traced:
+    _scope = SPREADSHEET_SCOPE
+
+    def __init__(self, target):
+        self._target = target
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            with api_call(self._scope, name):
+                return self._wrap_result(name, attr(*args, **kwargs))
+        return call
+
+    def _wrap_result(self, name, result):
+        return result
+
+class TracedWorksheet(_Traced):
+    @property
+    def _scope(self):
+        return self._target.title
+
+class TracedSpreadsheet(_Traced):
+    def _wrap_result(self, name, result):
+        return TracedWorksheet(result) if name == "worksheet" else result
+
+def open_traced(open_fn, source_str):
+    with api_call(SPREADSHEET_SCOPE, "open"):
+        return TracedSpreadsheet(open_fn(source_str))
+
+def instrument_client(client):
+    # 真實 gspread 的所有請求都經過 http_client.request，在這裡量回應大小
+    http = getattr(client, "http_client", None)
+    if http is None or getattr(http, "_traced", False):
+        return client
+    original = http.request
+
+    def request(*args, **kwargs):
+        response = original(*args, **kwargs)
+        _record_bytes(len(response.content or b""))
+        return response
+
+    http.request = request
+    http._traced = True
+    return client
+
+# ==========================================
+# 匯出：Prometheus 文字格式
+# ==========================================
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def prometheus_text():
+    with _registry_lock:
+        lines = [
+            "# TYPE expense_tracker_reruns_total counter",
+            f"expense_tracker_reruns_total {_registry['reruns']}",
+            "# TYPE expense_tracker_rerun_seconds_total counter",
+            f"expense_tracker_rerun_seconds_total {_registry['rerun_seconds']:.6f}",
+            "# TYPE expense_tracker_stage_seconds_total counter",
+        ]
+        for name, (seconds, _) in sorted(_registry["stages"].items()):
+            lines.append(f'expense_tracker_stage_seconds_total{{stage="{_label(name)}"}} {seconds:.6f}')
+        lines.append("# TYPE expense_tracker_stage_calls_total counter")
+        for name, (_, count) in sorted(_registry["stages"].items()):
+            lines.append(f'expense_tracker_stage_calls_total{{stage="{_label(name)}"}} {count}')
+        lines.append("# TYPE expense_tracker_api_calls_total counter")
+        for (ws, method), n in sorted(_registry["api_calls"].items()):
+            lines.append(f'expense_tracker_api_calls_total{{worksheet="{_label(ws)}",method="{_label(method)}"}} {n}')
+        lines.append("# TYPE expense_tracker_api_bytes_total counter")
+        for ws, n in sorted(_registry["api_bytes"].items()):
+            lines.append(f'expense_tracker_api_bytes_total{{worksheet="{_label(ws)}"}} {n}')
+        lines.append("# TYPE expense_tracker_cache_requests_total counter")
+        for (key, result), n in sorted(_registry["cache"].items()):
+            lines.append(f'expense_tracker_cache_requests_total{{key="{_label(key)}",result="{result}"}} {n}')
+    return "\n".join(lines) + "\n"
+
+def _write_textfile():
+    # 給 node_exporter textfile collector 讀取
+    path = os.environ.get("METRICS_TEXTFILE")
+    if not path:
+        return
+    # 同一行程裡每個 session 執行緒各用一個暫存檔，避免同時重跑時互相覆寫
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(prometheus_text())
+        os.replace(tmp_path, path)
+    except OSError:
+        logger.warning("無法寫入 METRICS_TEXTFILE: %s", path)
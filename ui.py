@@ -0,0 +1,787 @@
+import streamlit as st
+import pandas as pd
+from datetime import datetime, timedelta, timezone
+import time
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import analytics
+import login
+import reports
+import sheets
+import tracing
+from budget import budget_message, forecast_month_end, upcoming_recurring
+from rates import calculate_exchange, get_exchange_rates
+from recurring import check_and_run_recurring
+
+# ==========================================
+# 1. 連線
+# ==========================================
+def check_connection(source_str):
+    client = sheets.get_gspread_client()
+    if not client:
+        st.error("❌ 系統錯誤：無法讀取機器人金鑰。")
+        st.stop()
+
+    try:
+        sheet = sheets.open_spreadsheet(client, source_str)
+        st.query_params["sheet"] = source_str
+        return sheet.title
+    except Exception:
+        st.error("❌ 連線失敗")
+        st.warning("請確認網址或名稱正確，且已分享給機器人。")
+        email = login.bot_email()
+        if email:
+            st.code(email, language="text")
+        if st.button("⬅️ 返回"):
+            st.session_state.current_sheet_name = None
+            st.query_params.clear()
+            st.rerun()
+        st.stop()
+
+def get_user_date(offset_hours):
+    tz = timezone(timedelta(hours=offset_hours))
+    return datetime.now(tz).date()
+
+# ==========================================
+# 2. 收支分析 (依資料版本與篩選條件快取)
+# ==========================================
+def _build_ledger_series(tx_df):
+    tracing.cache_miss()
+    with tracing.stage("analytics.build_series"):
+        return analytics.build_series(analytics.prepare_ledger(tx_df))
+
+def get_ledger_series(source_str):
+    # 整份序列很大且唯讀，放在表格快取裡跟著資料版本失效，不用每次重跑 pickle
+    return sheets.get_derived("Transactions", source_str, "series", _build_ledger_series)
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def get_range_report(source_str, data_version, start_month, end_month, _series):
+    tracing.cache_miss()
+    return analytics.range_report(_series, start_month, end_month)
+
+# ==========================================
+# 3. 報表匯出 (背景執行)
+# ==========================================
+@st.cache_resource
+def get_export_executor():
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="export")
+
+def start_export(fmt, tx_df, file_stem, start_month=None, end_month=None):
+    old_job = st.session_state.get("export_job")
+    if old_job and old_job["future"].done() and not old_job["future"].exception():
+        try:
+            os.remove(old_job["future"].result()["path"])
+        except OSError:
+            pass
+
+    progress = {"rows": 0, "total": 0}
+    future = get_export_executor().submit(reports.run_export, fmt, tx_df, file_stem, start_month, end_month, progress)
+    st.session_state.export_job = {"future": future, "progress": progress}
+
+@st.fragment(run_every=1)
+def export_progress(job):
+    # 只有這一塊每秒重跑；完成後整頁重跑一次以顯示下載按鈕
+    if job["future"].done():
+        st.rerun()
+    total = job["progress"]["total"]
+    done = job["progress"]["rows"]
+    st.progress(done / total if total else 0.0, text=f"⏳ 背景產生中… {done:,} / {total:,} 筆")
+
+# ==========================================
+# 4. 設定
+# ==========================================
+def load_settings(source_str, title, rates):
+    settings_df = sheets.get_data("Settings", source_str)
+    cat_mapping = {}     
+    payment_list = []
+    currency_list_custom = []
+    default_currency_setting = "TWD" 
+    budget_map = {}
+
+    if not settings_df.empty:
+        if "Main_Category" in settings_df.columns and "Sub_Category" in settings_df.columns:
+            valid_cats = settings_df[["Main_Category", "Sub_Category"]].astype(str)
+            valid_cats = valid_cats[valid_cats["Main_Category"] != ""]
+            for _, row in valid_cats.iterrows():
+                main = row["Main_Category"]
+                sub = row["Sub_Category"]
+                if main not in cat_mapping: cat_mapping[main] = []
+                if sub and sub != "" and sub not in cat_mapping[main]: cat_mapping[main].append(sub)
+    
+        if "Payment_Method" in settings_df.columns:
+            payment_list = settings_df[settings_df["Payment_Method"] != ""]["Payment_Method"].unique().tolist()
+    
+        if "Currency" in settings_df.columns:
+            currency_list_custom = settings_df[settings_df["Currency"] != ""]["Currency"].unique().tolist()
+    
+        if "Default_Currency" in settings_df.columns:
+            saved_defaults = settings_df[settings_df["Default_Currency"] != ""]["Default_Currency"].unique().tolist()
+            if saved_defaults:
+                default_currency_setting = saved_defaults[0]
+
+        if "Budget_Category" in settings_df.columns and "Budget_Amount" in settings_df.columns:
+            valid_budgets = settings_df[settings_df["Budget_Category"].astype(str) != ""]
+            for cat, amt in zip(valid_budgets["Budget_Category"].astype(str), pd.to_numeric(valid_budgets["Budget_Amount"], errors='coerce')):
+                if amt > 0: budget_map[cat] = float(amt)
+
+    if not cat_mapping: 
+        cat_mapping = {"收入": ["薪資"], "食": ["早餐"]}
+    elif "收入" not in cat_mapping:
+        cat_mapping["收入"] = ["薪資"]
+
+    if not payment_list: payment_list = ["現金"]
+
+    if not currency_list_custom: 
+        currency_list_custom = ["TWD"]
+
+    if default_currency_setting not in currency_list_custom:
+        default_currency_setting = currency_list_custom[0]
+
+    main_cat_list = list(cat_mapping.keys())
+
+    try:
+        curr_index = currency_list_custom.index(default_currency_setting)
+    except ValueError:
+        curr_index = 0
+
+    return {
+        "source": source_str,
+        "title": title,
+        "rates": rates,
+        "cat_mapping": cat_mapping,
+        "main_cat_list": main_cat_list,
+        "payment_list": payment_list,
+        "currency_list": currency_list_custom,
+        "curr_index": curr_index,
+        "default_currency": default_currency_setting,
+        "budget_map": budget_map,
+    }
+
+# --- Callback 函式 ---
+def save_all_to_sheet(cfg):
+    rows = []
+    if 'temp_cat_map' in st.session_state:
+        for m, subs in st.session_state.temp_cat_map.items():
+            if not subs: 
+                rows.append({"Main_Category": m, "Sub_Category": ""})
+            else:
+                for s in subs:
+                    rows.append({"Main_Category": m, "Sub_Category": s})
+    
+    df_cat_new = pd.DataFrame(rows)
+    list_pay = st.session_state.get('temp_pay_list', cfg["payment_list"])
+    list_curr = st.session_state.get('temp_curr_list', cfg["currency_list"])
+    cat_keys = st.session_state.get('temp_cat_map', cfg["cat_mapping"]).keys()
+    list_budget = [(c, v) for c, v in st.session_state.get('temp_budget_map', cfg["budget_map"]).items() if v and c in cat_keys]
+    
+    max_len = max(len(df_cat_new), len(list_pay), len(list_curr), len(list_budget), 1)
+    final_df = pd.DataFrame()
+    
+    if not df_cat_new.empty:
+        final_df["Main_Category"] = df_cat_new["Main_Category"].reindex(range(max_len)).fillna("")
+        final_df["Sub_Category"] = df_cat_new["Sub_Category"].reindex(range(max_len)).fillna("")
+    else:
+        final_df["Main_Category"] = [""] * max_len
+        final_df["Sub_Category"] = [""] * max_len
+        
+    final_df["Payment_Method"] = pd.Series(list_pay).reindex(range(max_len)).fillna("")
+    final_df["Currency"] = pd.Series(list_curr).reindex(range(max_len)).fillna("")
+    final_df["Budget_Category"] = pd.Series([c for c, _ in list_budget], dtype=object).reindex(range(max_len)).fillna("")
+    final_df["Budget_Amount"] = pd.Series([v for _, v in list_budget], dtype=object).reindex(range(max_len)).fillna("")
+    
+    final_df["Default_Currency"] = ""
+    if len(final_df) > 0:
+        final_df.at[0, "Default_Currency"] = st.session_state.get('temp_default_curr', cfg["default_currency"])
+    
+    if sheets.save_settings_data(final_df, cfg["source"]):
+        st.toast("✅ 設定已儲存！", icon="💾")
+
+def add_sub_callback(main_cat, key):
+    new_val = st.session_state[key]
+    if new_val:
+        if new_val not in st.session_state.temp_cat_map[main_cat]:
+            st.session_state.temp_cat_map[main_cat].append(new_val)
+        st.session_state[key] = "" 
+
+def add_pay_callback(key):
+    new_val = st.session_state[key]
+    if new_val:
+        if new_val not in st.session_state.temp_pay_list:
+            st.session_state.temp_pay_list.append(new_val)
+        st.session_state[key] = ""
+
+def update_budget_callback(main_cat, key, cfg):
+    st.session_state.temp_budget_map[main_cat] = st.session_state[key]
+    save_all_to_sheet(cfg)
+
+def add_curr_callback(key):
+    new_val = st.session_state[key]
+    if new_val:
+        if new_val not in st.session_state.temp_curr_list:
+            st.session_state.temp_curr_list.append(new_val)
+        st.session_state[key] = ""
+
+# ==========================================
+# 5. 主程式 UI 邏輯
+# ==========================================
+def render_chart(fig):
+    with tracing.stage("plotly.render"):
+        st.plotly_chart(fig, use_container_width=True)
+
+def show_trace_panel():
+    last = st.session_state.get("_last_trace")
+    with st.expander("🛠️ 效能追蹤 (管理員)"):
+        if not last:
+            st.caption("下一次重跑後顯示")
+            return
+        st.caption(f"上一次重跑：{last['seconds']:.3f} 秒")
+        stages_df = pd.DataFrame([{"階段": k, "秒": v["seconds"], "次數": v["count"]} for k, v in last["stages"].items()])
+        if not stages_df.empty:
+            st.dataframe(stages_df.sort_values("秒", ascending=False), hide_index=True, use_container_width=True)
+        if last["api_calls"]:
+            st.dataframe(pd.DataFrame(last["api_calls"]), hide_index=True, use_container_width=True)
+        if last["api_bytes"]:
+            bytes_df = pd.DataFrame(list(last["api_bytes"].items()), columns=["worksheet", "bytes"])
+            st.dataframe(bytes_df, hide_index=True, use_container_width=True)
+        if last["cache"]:
+            st.dataframe(pd.DataFrame(last["cache"]), hide_index=True, use_container_width=True)
+        st.download_button("📄 JSON 紀錄", json.dumps(last, ensure_ascii=False, indent=2), file_name="trace.json", mime="application/json", use_container_width=True)
+        st.download_button("📈 Prometheus 指標", tracing.prometheus_text(), file_name="metrics.prom", mime="text/plain", use_container_width=True)
+
+def render_sidebar(title):
+    with st.sidebar:
+        st.header("🌍 地區設定")
+        st.success(f"📘 帳本：{title}")
+    
+        # [新增] 強制同步按鈕
+        if st.button("🔄 強制同步最新資料", type="primary"):
+            sheets.clear_data_cache()
+            st.toast("已清除快取，正在重新讀取 Google Sheet...")
+            time.sleep(1)
+            st.rerun()
+
+        if st.button("🚪 切換帳本 (登出)"):
+            keys_to_clear = ["current_sheet_name", "current_sheet_source", "current_sheet_title"]
+            for key in keys_to_clear:
+                if key in st.session_state:
+                    del st.session_state[key]
+            st.query_params.clear()
+            sheets.clear_data_cache()
+            st.rerun()
+        
+        st.divider()
+        tz_options = {"台灣/新加坡 (UTC+8)": 8, "日本/韓國 (UTC+9)": 9, "泰國 (UTC+7)": 7, "美東 (UTC-4)": -4, "歐洲 (UTC+1)": 1}
+        selected_tz_label = st.selectbox("當前位置時區", list(tz_options.keys()), index=0)
+        user_offset = tz_options[selected_tz_label]
+        st.info(f"日期：{get_user_date(user_offset)}")
+
+        if login.is_admin():
+            show_trace_panel()
+    return user_offset
+
+# ================= Tab 1: 每日記帳 =================
+def render_daily_tab(cfg, user_offset):
+    source_str, rates = cfg["source"], cfg["rates"]
+    cat_mapping, main_cat_list = cfg["cat_mapping"], cfg["main_cat_list"]
+    payment_list, currency_list_custom = cfg["payment_list"], cfg["currency_list"]
+    default_currency_setting, budget_map = cfg["default_currency"], cfg["budget_map"]
+
+    if st.session_state.get('should_clear_input'):
+        st.session_state.form_amount_org = 0.0
+        st.session_state.form_amount_def = 0.0
+        st.session_state.form_note = ""
+        st.session_state.should_clear_input = False
+
+    if st.session_state.get('budget_warning'):
+        st.warning(f"⚠️ {st.session_state.pop('budget_warning')}")
+
+    if 'form_currency' not in st.session_state: st.session_state.form_currency = default_currency_setting
+    if 'form_amount_org' not in st.session_state: st.session_state.form_amount_org = 0.0
+    if 'form_amount_def' not in st.session_state: st.session_state.form_amount_def = 0.0
+    if 'form_note' not in st.session_state: st.session_state.form_note = ""
+
+    def on_input_change():
+        c = st.session_state.form_currency
+        a = st.session_state.form_amount_org
+        val, _ = calculate_exchange(a, c, default_currency_setting, rates)
+        st.session_state.form_amount_def = val
+
+    user_today = get_user_date(user_offset)
+    current_month_str = user_today.strftime("%Y-%m")
+    
+    tx_df = sheets.get_data("Transactions", source_str)
+
+    total_income = 0
+    total_expense = 0
+    
+    if not tx_df.empty and 'Date' in tx_df.columns:
+        with tracing.stage("parse.to_datetime"):
+            tx_df['Date'] = pd.to_datetime(tx_df['Date'], errors='coerce')
+        mask = (tx_df['Date'].dt.strftime('%Y-%m') == current_month_str)
+        month_tx = tx_df[mask]
+        month_tx['Amount_Def'] = pd.to_numeric(month_tx['Amount_Def'], errors='coerce').fillna(0)
+        
+        if 'Type' in month_tx.columns:
+            total_income = month_tx[month_tx['Type'] == '收入']['Amount_Def'].sum()
+            total_expense = month_tx[month_tx['Type'] != '收入']['Amount_Def'].sum()
+    
+    balance = total_income - total_expense
+    balance_class = "val-green" if balance >= 0 else "val-red"
+
+    st.markdown(f"""
+    <div class="metric-container">
+        <div class="metric-card">
+            <span class="metric-label">本月總收入 ({default_currency_setting})</span>
+            <span class="metric-value">${total_income:,.2f}</span>
+        </div>
+        <div class="metric-card">
+            <span class="metric-label">已支出 ({default_currency_setting})</span>
+            <span class="metric-value">${total_expense:,.2f}</span>
+        </div>
+        <div class="metric-card">
+            <span class="metric-label">剩餘可用</span>
+            <span class="metric-value {balance_class}">${balance:,.2f}</span>
+        </div>
+    </div>
+    """, unsafe_allow_html=True)
+
+    # --- 本月預算 ---
+    upcoming = {}
+    if budget_map:
+        upcoming = upcoming_recurring(sheets.get_data("Recurring", source_str), user_today, default_currency_setting, rates)
+        forecast = forecast_month_end(sheets.get_month_burn(source_str, current_month_str), upcoming, budget_map, user_today)
+        with st.expander("🎯 本月預算與月底預估", expanded=True):
+            for cat, budget in budget_map.items():
+                f = forecast[cat]
+                st.progress(max(0.0, min(f["spent"] / budget, 1.0)), text=f"{cat}：${f['spent']:,.0f} / ${budget:,.0f}　預估月底 ${f['projected']:,.0f}")
+                msg = budget_message(cat, f)
+                if msg: st.caption(f":red[{msg}]")
+
+    with st.container():
+        st.markdown("##### ✍️ 新增交易")
+        c1, c2 = st.columns([1, 1])
+        with c1: 
+            date_input = st.date_input("日期", user_today)
+        with c2: payment = st.selectbox("付款方式", payment_list)
+        c3, c4 = st.columns([1, 1])
+        with c3: main_cat = st.selectbox("大類別", main_cat_list, key="input_main_cat")
+        with c4: sub_cat = st.selectbox("次類別", cat_mapping.get(main_cat, []))
+
+        with st.container(border=True): 
+            st.caption("💰 金額設定")
+            c5, c6, c7 = st.columns([1.5, 2, 2])
+            
+            with c5: currency = st.selectbox("幣別", currency_list_custom, index=cfg["curr_index"], key="form_currency", on_change=on_input_change)
+            with c6: amount_org = st.number_input(f"金額 ({currency})", step=1.0, key="form_amount_org", on_change=on_input_change)
+            with c7: 
+                amount_def = st.number_input(f"折合 {default_currency_setting}", step=0.1, key="form_amount_def")
+                if currency != default_currency_setting and amount_org != 0:
+                     _, rate_used = calculate_exchange(100, currency, default_currency_setting, rates)
+                     if rate_used > 0: st.caption(f"匯率: {rate_used:.4f}")
+
+        note = st.text_input("備註", max_chars=20, placeholder="輸入消費內容 (限20字)...", key="form_note")
+        st.markdown("<br>", unsafe_allow_html=True)
+        
+        if st.button("確認送出記帳", type="primary", use_container_width=True):
+            if amount_def == 0:
+                st.error("金額不能為 0")
+            else:
+                with st.spinner('📡 資料寫入中...'):
+                    tx_type = "收入" if main_cat == "收入" else "支出"
+                    sys_now = datetime.now()
+                    row = [str(date_input), tx_type, main_cat, sub_cat, payment, currency, amount_org, amount_def, note, str(sys_now)]
+                    
+                    if sheets.append_data("Transactions", row, source_str):
+                        st.success(f"✅ {tx_type}已記錄 ${amount_def:,.2f}！")
+                        st.session_state['should_clear_input'] = True
+                        # 預算檢查只用增量更新後的逐日曲線，不重讀帳本
+                        if main_cat in budget_map and str(date_input)[:7] == current_month_str:
+                            f = forecast_month_end(sheets.get_month_burn(source_str, current_month_str), upcoming, budget_map, user_today)[main_cat]
+                            msg = budget_message(main_cat, f)
+                            if msg:
+                                st.warning(f"⚠️ {msg}")
+                                st.session_state['budget_warning'] = msg
+                        time.sleep(1)
+                        st.rerun()
+                    else:
+                        st.error("❌ 寫入失敗")
+
+# ================= Tab 2: 收支分析 =================
+def render_analysis_tab(cfg):
+    source_str, title = cfg["source"], cfg["title"]
+    default_currency_setting, main_cat_list = cfg["default_currency"], cfg["main_cat_list"]
+
+    st.markdown("##### 📊 收支狀況")
+    df_tx = sheets.get_data("Transactions", source_str)
+
+    if df_tx.empty:
+        st.info("尚無交易資料")
+    else:
+        with tracing.stage("plotly.import"):
+            import plotly.express as px
+        tx_version = sheets.get_data_version("Transactions", source_str)
+        with tracing.cache_probe("get_ledger_series"):
+            series = get_ledger_series(source_str)
+        all_months = list(series["monthly"].index)
+        chart_layout = dict(paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", margin=dict(t=20, l=10, r=10, b=10))
+        
+        with st.expander("📅 篩選區間", expanded=True):
+            if len(all_months) > 0:
+                c_sel1, c_sel2 = st.columns(2)
+                with c_sel1: start_month = st.selectbox("開始月份", all_months, index=0)
+                with c_sel2: end_month = st.selectbox("結束月份", all_months, index=len(all_months)-1)
+                with tracing.cache_probe("get_range_report"):
+                    report = get_range_report(source_str, tx_version, start_month, end_month, series)
+                range_monthly = report["monthly"]
+                
+                trend_data = range_monthly[["Income", "Expense"]].rename(columns={"Income": "收入", "Expense": "支出"})
+                trend_data = trend_data.rename_axis("Month").reset_index().melt(id_vars="Month", var_name="Type", value_name="Amount")
+                
+                if not trend_data.empty:
+                    fig_trend = px.bar(trend_data, x="Month", y="Amount", color="Type", barmode="group", 
+                                     color_discrete_map={"收入": "#2ecc71", "支出": "#ff6b6b"})
+                    fig_trend.add_scatter(x=range_monthly.index, y=range_monthly["Expense_3M"], name="支出 3 個月均線",
+                                          mode="lines+markers", line=dict(color="#c0392b", dash="dot"))
+                    fig_trend.update_layout(**chart_layout)
+                    render_chart(fig_trend)
+
+        if len(all_months) > 0 and not range_monthly.empty:
+            with st.expander("📈 支出趨勢與年增率"):
+                daily_trend = report["daily"][["Expense_7D", "Expense_30D"]].rename(columns={"Expense_7D": "7 日均線", "Expense_30D": "30 日均線"})
+                fig_daily = px.line(daily_trend, labels={"index": "Date", "value": "Amount", "variable": ""})
+                fig_daily.update_layout(**chart_layout)
+                render_chart(fig_daily)
+
+                yoy_df = range_monthly[["Expense", "Expense_LY", "Expense_YoY"]].copy()
+                yoy_df["Expense_YoY"] = yoy_df["Expense_YoY"] * 100
+                st.dataframe(
+                    yoy_df.sort_index(ascending=False),
+                    use_container_width=True,
+                    column_config={
+                        "Expense": st.column_config.NumberColumn("本月支出", format="%.0f"),
+                        "Expense_LY": st.column_config.NumberColumn("去年同月", format="%.0f"),
+                        "Expense_YoY": st.column_config.NumberColumn("年增率", format="%+.1f%%"),
+                    },
+                )
+
+            with st.expander("🧩 類別占比與付款方式"):
+                share = report["category_share"]
+                if not share.empty:
+                    share_data = share.rename_axis("Month").reset_index().melt(id_vars="Month", var_name="Main_Category", value_name="Share")
+                    fig_share = px.bar(share_data, x="Month", y="Share", color="Main_Category",
+                                       color_discrete_sequence=px.colors.qualitative.Pastel)
+                    fig_share.update_layout(yaxis_tickformat=".0%", **chart_layout)
+                    render_chart(fig_share)
+
+                payment = report["payment"]
+                if not payment.empty:
+                    fig_pay = px.bar(x=payment.values, y=payment.index, orientation="h", labels={"x": "Amount", "y": "Payment_Method"})
+                    fig_pay.update_layout(yaxis=dict(autorange="reversed"), **chart_layout)
+                    render_chart(fig_pay)
+
+        # st.markdown("---")
+        with st.expander("🗓️ 查看詳細月份", expanded=True):
+            target_month = st.selectbox("選擇月份", sorted(all_months, reverse=True))
+            
+            summary = analytics.month_summary(series, target_month)
+            monthly_income = summary["income"]
+            monthly_expense = summary["expense"]
+            month_data = df_tx.loc[df_tx.index.intersection(series["month_rows"].get(target_month, []))].copy()
+            with tracing.stage("parse.to_datetime"):
+                month_data['Date'] = pd.to_datetime(month_data['Date'], errors='coerce')
+            month_data['Amount_Def'] = pd.to_numeric(month_data['Amount_Def'], errors='coerce').fillna(0)
+            
+            st.markdown(f"""
+            <div class="metric-container">
+                <div class="metric-card" style="border-left: 5px solid #2ecc71;">
+                    <span class="metric-label">總收入 ({default_currency_setting})</span>
+                    <span class="metric-value">${monthly_income:,.2f}</span>
+                </div>
+                <div class="metric-card" style="border-left: 5px solid #ff6b6b;">
+                    <span class="metric-label">總支出 ({default_currency_setting})</span>
+                    <span class="metric-value">${monthly_expense:,.2f}</span>
+                </div>
+                <div class="metric-card">
+                    <span class="metric-label">結餘</span>
+                    <span class="metric-value">${monthly_income - monthly_expense:,.2f}</span>
+                </div>
+            </div>
+            """, unsafe_allow_html=True)
+
+            if (month_data['Type'] != '收入').any():
+                pie_data = summary["categories"].rename("Amount_Def").rename_axis("Main_Category").reset_index()
+                
+                if not pie_data.empty:
+                    fig_pie = px.pie(pie_data, values="Amount_Def", names="Main_Category", hole=0.5,
+                                    color_discrete_sequence=px.colors.qualitative.Pastel)
+                    fig_pie.update_layout(margin=dict(t=20, b=20, l=20, r=20))
+                    render_chart(fig_pie)
+                else:
+                    st.info("本月支出相抵後無正向金額，無法顯示圓餅圖。")
+                
+        # [新增] 除錯用明細表
+        with st.expander("🔍 檢視本月明細 (除錯用)"):
+            debug_df = month_data[['Date', 'Main_Category', 'Sub_Category', 'Amount_Original', 'Currency', 'Amount_Def', 'Note']].sort_values(by='Date', ascending=False)
+            st.dataframe(debug_df, use_container_width=True)
+
+        # 修改 / 刪除交易 (依 ID 定位，只寫回有變動的列)
+        with st.expander("✏️ 修改 / 刪除本月交易"):
+            edit_cols = ['Date', 'Main_Category', 'Sub_Category', 'Payment_Method', 'Currency', 'Amount_Original', 'Amount_Def', 'Note']
+            edit_src = month_data.sort_values(by='Date', ascending=False)[edit_cols + ['ID', 'Version']].copy()
+            edit_src['Date'] = edit_src['Date'].dt.date
+            edit_src.insert(0, '刪除', False)
+            edited_df = st.data_editor(
+                edit_src,
+                key=f"tx_editor_{target_month}",
+                hide_index=True,
+                use_container_width=True,
+                column_order=['刪除'] + edit_cols,
+                column_config={
+                    "Date": st.column_config.DateColumn("Date", format="YYYY-MM-DD"),
+                    "Main_Category": st.column_config.SelectboxColumn("Main_Category", options=main_cat_list),
+                },
+            )
+
+            if st.button("💾 儲存變更", key="save_tx_edits", type="primary", use_container_width=True):
+                tx_edits, tx_deletes = {}, {}
+                for i, before in edit_src.iterrows():
+                    after = edited_df.loc[i]
+                    if after['刪除']:
+                        tx_deletes[before['ID']] = before['Version']
+                        continue
+                    changes = {c: after[c] for c in edit_cols if sheets.cell_text(after[c]) != sheets.cell_text(before[c])}
+                    if changes:
+                        if 'Date' in changes: changes['Date'] = str(changes['Date'])
+                        if 'Main_Category' in changes: changes['Type'] = "收入" if changes['Main_Category'] == "收入" else "支出"
+                        tx_edits[before['ID']] = (before['Version'], changes)
+
+                if not tx_edits and not tx_deletes:
+                    st.info("沒有任何變更")
+                elif sheets.apply_row_changes("Transactions", source_str, edits=tx_edits, deletes=tx_deletes):
+                    st.toast(f"✅ 已更新 {len(tx_edits)} 筆、刪除 {len(tx_deletes)} 筆")
+                    time.sleep(1)
+                    st.rerun()
+
+        # 匯出報表 (背景產生，不會卡住畫面)
+        with st.expander("📤 匯出報表"):
+            c_ex1, c_ex2 = st.columns(2)
+            with c_ex1: export_scope = st.radio("範圍", ["全部帳本", "篩選區間"], horizontal=True, key="export_scope")
+            with c_ex2: export_fmt = st.radio("格式", list(reports.EXPORT_FORMATS.keys()), horizontal=True, key="export_fmt")
+            if export_scope == "篩選區間" and len(all_months) > 0:
+                st.caption(f"區間：{start_month} ~ {end_month}")
+
+            export_job = st.session_state.get("export_job")
+            export_running = export_job is not None and not export_job["future"].done()
+            if st.button("📦 開始產生", key="start_export", use_container_width=True, disabled=export_running):
+                if export_scope == "篩選區間" and len(all_months) > 0:
+                    start_export(export_fmt, df_tx, f"{title}_{start_month}_{end_month}", start_month, end_month)
+                else:
+                    start_export(export_fmt, df_tx, f"{title}_全部")
+                st.rerun()
+
+            if export_running:
+                export_progress(export_job)
+            elif export_job is not None:
+                if export_job["future"].exception():
+                    st.error(f"匯出失敗: {export_job['future'].exception()}")
+                else:
+                    result = export_job["future"].result()
+                    if os.path.exists(result["path"]):
+                        # 傳入函式，點下去才讀檔，不會每次重跑都把整個檔案載入記憶體
+                        st.download_button(f"⬇️ 下載 {result['file_name']} ({result['rows']:,} 筆)", partial(reports.read_export, result["path"]),
+                                           file_name=result["file_name"], mime=result["mime"], type="primary", use_container_width=True)
+
+# ================= Tab 3: 設定管理 =================
+def render_settings_tab(cfg):
+    source_str, rates = cfg["source"], cfg["rates"]
+    cat_mapping, main_cat_list = cfg["cat_mapping"], cfg["main_cat_list"]
+    payment_list, currency_list_custom = cfg["payment_list"], cfg["currency_list"]
+    default_currency_setting, budget_map = cfg["default_currency"], cfg["budget_map"]
+
+    st.markdown("##### ⚙️ 系統資料庫")
+    
+    if 'temp_cat_map' not in st.session_state: st.session_state.temp_cat_map = cat_mapping
+    if 'temp_pay_list' not in st.session_state: st.session_state.temp_pay_list = payment_list
+    if 'temp_curr_list' not in st.session_state: st.session_state.temp_curr_list = currency_list_custom
+    if 'temp_default_curr' not in st.session_state: st.session_state.temp_default_curr = default_currency_setting
+    if 'temp_budget_map' not in st.session_state: st.session_state.temp_budget_map = dict(budget_map)
+
+    # 1. 固定收支
+    with st.expander("🔄 每月固定收支 (薪資、房租...)", expanded=True):
+        with st.popover("➕ 新增固定規則", use_container_width=True):
+            st.markdown("###### 設定每月自動執行的項目")
+            if 'rec_currency' not in st.session_state: st.session_state.rec_currency = default_currency_setting
+            if 'rec_amount_org' not in st.session_state: st.session_state.rec_amount_org = 0.0
+            
+            def on_rec_change():
+                c = st.session_state.rec_currency
+                a = st.session_state.rec_amount_org
+                val, _ = calculate_exchange(a, c, default_currency_setting, rates)
+                st.session_state.rec_amount_def = val
+
+            rec_day = st.number_input("每月幾號執行?", min_value=1, max_value=31, value=5)
+            c_rec1, c_rec2 = st.columns(2)
+            with c_rec1: rec_main = st.selectbox("大類別", main_cat_list, key="rec_main")
+            with c_rec2: rec_sub = st.selectbox("次類別", cat_mapping.get(rec_main, []), key="rec_sub")
+            rec_pay = st.selectbox("付款方式", payment_list, key="rec_pay")
+            c_r1, c_r2, c_r3 = st.columns([1.5, 2, 2])
+            with c_r1: rec_curr = st.selectbox("幣別", currency_list_custom, index=cfg["curr_index"], key="rec_currency", on_change=on_rec_change)
+            with c_r2: rec_amt_org = st.number_input("原幣金額", step=1.0, key="rec_amount_org", on_change=on_rec_change)
+            with c_r3: rec_amt_def = st.number_input(f"折合 {default_currency_setting}", step=0.1, key="rec_amount_def")
+            rec_note = st.text_input("備註 (例如: 房租)", key="rec_note")
+            
+            if st.button("儲存規則", type="primary", use_container_width=True):
+                rec_type = "收入" if rec_main == "收入" else "支出"
+                new_rule = [rec_day, rec_type, rec_main, rec_sub, rec_pay, rec_curr, rec_amt_org, rec_note, "New", "Active"]
+                if sheets.append_data("Recurring", new_rule, source_str):
+                    st.success("✅ 規則已新增！")
+                    time.sleep(1)
+                    st.rerun()
+
+        st.markdown("---")
+        rec_df = sheets.get_data("Recurring", source_str)
+        if not rec_df.empty:
+            for _, row in rec_df.iterrows():
+                header_txt = f"📅 每月 {row['Day']} 號 - {row['Main_Category']} > {row['Sub_Category']} > {row['Amount_Original']} {row['Currency']}"
+                with st.expander(header_txt):
+                    c_list1, c_list2 = st.columns([4, 1])
+                    with c_list1:
+                        st.write(f"📝 {row['Note']} | {row['Amount_Original']} {row['Currency']} ({row['Payment_Method']})")
+                    with c_list2:
+                        if st.button("🗑️ 刪除", key=f"del_rec_{row['ID']}", type="primary"):
+                            if sheets.delete_recurring_rule(row['ID'], row['Version'], source_str):
+                                st.toast("規則已刪除")
+                                time.sleep(1)
+                                st.rerun()
+        else:
+            st.info("目前沒有設定固定收支規則")
+
+    # 2. 類別管理
+    with st.expander("📂 類別與子類別管理"):
+        with st.popover("➕ 新增大類", use_container_width=True):
+            new_main = st.text_input("類別名稱", placeholder="例如: 醫療", label_visibility="collapsed")
+            if st.button("確認新增", type="primary", use_container_width=True):
+                if new_main and new_main not in st.session_state.temp_cat_map:
+                    st.session_state.temp_cat_map[new_main] = []
+                    save_all_to_sheet(cfg)
+                    st.rerun()
+                    
+        for idx, main in enumerate(st.session_state.temp_cat_map.keys()):
+            with st.container():
+                with st.expander(f"📁 {main}", expanded=False):
+                    new_main_name = st.text_input("名稱", value=main, key=f"ren_{idx}", label_visibility="collapsed")
+                    if new_main_name != main:
+                        st.session_state.temp_cat_map[new_main_name] = st.session_state.temp_cat_map.pop(main)
+                        save_all_to_sheet(cfg)
+                        st.rerun()
+                    
+                    current_subs = st.session_state.temp_cat_map[new_main_name]
+                    updated_subs = st.multiselect("子類", current_subs, default=current_subs, key=f"ms_{main}", on_change=lambda m=main, k=f"ms_{main}": [st.session_state.temp_cat_map.update({m: st.session_state[k]}), save_all_to_sheet(cfg)])
+                    
+                    cs1, cs2 = st.columns([3, 1])
+                    sub_key = f"new_sub_val_{main}"
+                    with cs1: 
+                        st.text_input("add", key=sub_key, label_visibility="collapsed", placeholder="新增子類別...")
+                    with cs2: 
+                        st.button("加入", key=f"bns_{main}", on_click=add_sub_callback, args=(main, sub_key))
+                            
+                    st.markdown("<br>", unsafe_allow_html=True)
+                    if st.button(f"🗑️ 刪除 {main}", key=f"dm_{main}", type="secondary", use_container_width=True):
+                        del st.session_state.temp_cat_map[main]
+                        save_all_to_sheet(cfg)
+                        st.rerun()
+
+    # 3. 其他設定
+    with st.expander("💳 付款與幣別"):
+        st.subheader("付款方式")
+        pays = st.session_state.temp_pay_list
+        u_pays = st.multiselect("付款", pays, default=pays, key="mp_pay", on_change=lambda: [st.session_state.update(temp_pay_list=st.session_state.mp_pay), save_all_to_sheet(cfg)])
+        
+        c_p1, c_p2 = st.columns([3,1])
+        with c_p1: 
+            st.text_input("np", key="new_pay_val", label_visibility="collapsed", placeholder="新增付款方式")
+        with c_p2: 
+            st.button("加入", key="bp", on_click=add_pay_callback, args=("new_pay_val",))
+        
+        st.divider()
+        st.subheader("常用幣別")
+        curs = st.session_state.temp_curr_list
+        u_curs = st.multiselect("幣別", curs, default=curs, key="mp_cur", on_change=lambda: [st.session_state.update(temp_curr_list=st.session_state.mp_cur), save_all_to_sheet(cfg)])
+        
+        c_c1, c_c2 = st.columns([3,1])
+        with c_c1: 
+            st.text_input("nc", key="new_curr_val", label_visibility="collapsed", placeholder="新增幣別")
+        with c_c2:
+            st.button("加入", key="bc", on_click=add_curr_callback, args=("new_curr_val",))
+                    
+        st.markdown("<br>", unsafe_allow_html=True)
+        st.caption("✨ 設定每日記帳的預設幣別：")
+        
+        try:
+            def_idx = st.session_state.temp_curr_list.index(st.session_state.temp_default_curr)
+        except ValueError:
+            def_idx = 0
+            
+        new_def_curr = st.selectbox(
+            "選擇預設幣別", 
+            st.session_state.temp_curr_list, 
+            index=def_idx, 
+            key="sel_def_curr",
+            label_visibility="collapsed"
+        )
+        if new_def_curr != st.session_state.temp_default_curr:
+            st.session_state.temp_default_curr = new_def_curr
+            save_all_to_sheet(cfg)
+            st.toast("預設幣別已更新")
+
+    # 4. 每月預算
+    with st.expander("🎯 每月預算"):
+        st.caption(f"設定各大類每月預算 ({st.session_state.temp_default_curr})，0 表示不設定")
+        for main in st.session_state.temp_cat_map.keys():
+            if main == "收入": continue
+            st.number_input(
+                f"📁 {main}",
+                min_value=0.0,
+                step=100.0,
+                value=float(st.session_state.temp_budget_map.get(main, 0.0)),
+                key=f"budget_{main}",
+                on_change=update_budget_callback,
+                args=(main, f"budget_{main}", cfg)
+            )
+
+    st.markdown("<br>", unsafe_allow_html=True)
+    if st.button("💾 儲存所有設定", type="primary", use_container_width=True):
+        save_all_to_sheet(cfg)
+        st.rerun()
+
+def main(source_str):
+    with tracing.stage("connect"):
+        title = check_connection(source_str)
+
+    user_offset = render_sidebar(title)
+
+    with tracing.stage("rates"), tracing.cache_probe("get_exchange_rates"):
+        rates = get_exchange_rates()
+    cfg = load_settings(source_str, title, rates)
+
+    with tracing.stage("recurring"):
+        check_and_run_recurring(source_str, cfg["default_currency"], rates)
+
+    # --- Header ---
+    c_logo, c_title = st.columns([1, 15]) 
+    with c_logo:
+        if os.path.exists("logo.png"): st.image("logo.png", width=60) 
+        else: st.write("💰")
+    with c_title:
+        st.markdown("<h2 style='margin-bottom: 0; padding-top: 10px;'>我的記帳本</h2>", unsafe_allow_html=True)
+
+    # --- 頁籤 ---
+    tab1, tab2, tab3 = st.tabs(["📝 每日記帳", "📊 收支分析", "⚙️ 系統設定"])
+    with tab1, tracing.stage("ui.tab1"):
+        render_daily_tab(cfg, user_offset)
+    with tab2, tracing.stage("ui.tab2"):
+        render_analysis_tab(cfg)
+    with tab3, tracing.stage("ui.tab3"):
+        render_settings_tab(cfg)